@@ -3,6 +3,13 @@ import sys
 import os
 sys.path.insert(0, 'distlib')
 
+# only visit contributing path items when declaring namespace packages,
+# the map is written by tools/namespace_map.py
+NAMESPACE_MAP = os.path.join(os.path.dirname(__file__), 'namespace_packages.map')
+if os.path.exists(NAMESPACE_MAP):
+    from pkg_resources import load_namespace_map
+    load_namespace_map(NAMESPACE_MAP)
+
 # register gae loader for pkg_resources
 if os.environ.get('SERVER_SOFTWARE', 'Development')[0:11] == "Development":
     from google.appengine.tools.dev_appserver_import_hook import (
@@ -10,9 +17,25 @@ if os.environ.get('SERVER_SOFTWARE', 'Development')[0:11] == "Development":
     )
     from pkg_resources import register_loader_type, DefaultProvider
     register_loader_type(HardenedModulesHook, DefaultProvider)
+else:
+    # the deployed distlib is complete, skip resolving on entry point loads
+    from pkg_resources import EntryPoint
+    EntryPoint.require_on_load = False
+
+# disable chameleon debug module loader, gae does not allow tempdirs.
+# chameleon is patched once it is imported for the first template.
+from lazyimport import when_imported
+
+
+def patch_chameleon(template):
+    from chameleon.loader import MemoryLoader
+    template._make_module_loader = MemoryLoader
+    template.BaseTemplate.loader = MemoryLoader()
+
+when_imported('chameleon.template', patch_chameleon)
 
-# disable chameleon debug module loader, gae does not allow tempdirs
-import chameleon.template
-from chameleon.loader import MemoryLoader
-chameleon.template._make_module_loader = MemoryLoader
-chameleon.template.BaseTemplate.loader = MemoryLoader()
+# pyramid's configuration imports its chameleon renderers, which import
+# chameleon, the renderer factories are only called on the first render
+from lazyimport import defer_module
+defer_module('pyramid.chameleon_zpt', 'renderer_factory')
+defer_module('pyramid.chameleon_text', 'renderer_factory')
@@ -0,0 +1,110 @@
+"""Defer work on heavy modules until they are imported.
+
+``when_imported`` registers a hook which is called with the module right
+after it was imported for the first time, i.e. to patch it. Modules are
+therefore only imported by whoever actually needs them.
+
+``defer_module`` goes further for modules imported by others at import
+time but only used later: a stand-in takes their place until one of their
+functions is called.
+"""
+import imp
+import sys
+import types
+
+_hooks = {}
+
+
+class _PostImportFinder(object):
+    """PEP 302 meta path hook calling the hooks of freshly imported modules
+    """
+
+    def __init__(self):
+        self._loading = set()
+
+    def find_module(self, fullname, path=None):
+        if fullname in _hooks and fullname not in self._loading:
+            return self
+        return None
+
+    def load_module(self, fullname):
+        # import it the regular way, this finder ignores it meanwhile
+        self._loading.add(fullname)
+        try:
+            __import__(fullname)
+        finally:
+            self._loading.discard(fullname)
+        module = sys.modules[fullname]
+        for hook in _hooks.pop(fullname, ()):
+            hook(module)
+        return module
+
+_finder = _PostImportFinder()
+sys.meta_path.insert(0, _finder)
+
+
+def when_imported(name, hook):
+    """Call ``hook(module)`` once the module `name` is imported
+
+    If the module was imported already the hook is called immediately.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        hook(module)
+    else:
+        _hooks.setdefault(name, []).append(hook)
+
+
+class _DeferredModule(types.ModuleType):
+    """Stand-in for a module, which is imported on the first call of one of
+    the forwarding functions or the first access to another attribute
+    """
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            # i.e. __file__ looked up on all modules by inspect.getmodule
+            raise AttributeError(name)
+        return getattr(_load(self.__name__), name)
+
+
+def _load(name):
+    """Replace the stand-in of `name` by the imported module"""
+    imp.acquire_lock()
+    try:
+        if isinstance(sys.modules.get(name), _DeferredModule):
+            del sys.modules[name]
+            # sets the attribute of the parent package as well
+            __import__(name)
+        return sys.modules[name]
+    finally:
+        imp.release_lock()
+
+
+def _forward(name, function):
+    def forward(*args, **kw):
+        return getattr(_load(name), function)(*args, **kw)
+    forward.__name__ = function
+    return forward
+
+
+def defer_module(name, *functions):
+    """Import the module `name` on the first call of one of its `functions`
+
+    A stand-in forwarding the `functions` is put into ``sys.modules`` and
+    the parent package, so ``from package import module`` gets it. Nothing
+    is deferred if the module was imported already.
+    """
+    if name in sys.modules:
+        return
+    stand_in = _DeferredModule(name)
+    for function in functions:
+        setattr(stand_in, function, _forward(name, function))
+    parent, _, attr = name.rpartition('.')
+    imp.acquire_lock()
+    try:
+        sys.modules[name] = stand_in
+        if parent:
+            setattr(__import__(parent, fromlist=['__name__']), attr,
+                    stand_in)
+    finally:
+        imp.release_lock()
@@ -3,8 +3,7 @@ import gaefixes  # first
 from appglobals import APP_BASE_DIR, DEBUG
 import logging
 import os
-from pyramid.config import Configurator
-from yaml import load
+import threading
 
 if DEBUG():
     logging.getLogger().setLevel(logging.DEBUG)
@@ -15,7 +14,16 @@ SETTINGS_FILE = os.path.join(APP_BASE_DIR, 'settings.yaml')
 
 
 def app_config():
-    config = Configurator(settings=load(open(SETTINGS_FILE, 'r').read()))
+    # pyramid, its translation support and the zca hooks are imported on
+    # first use only, see LazyApplication
+    from pkg_resources import set_resource_cache
+    from pyramid.config import Configurator
+    from yaml import load
+    settings = load(open(SETTINGS_FILE, 'r').read())
+    # serve package resources from memory, check their mtime in development
+    set_resource_cache(int(settings.get('resource_cache_bytes', 0)),
+                       validate=DEBUG())
+    config = Configurator(settings=settings)
     config.add_settings({'currentapp.basedir': APP_BASE_DIR})
     config.add_translation_dirs('example_app:locale/')
     config.hook_zca()
@@ -23,5 +31,28 @@ def app_config():
     # config.add_route('catchall', '{notfound:.*}')
     return config
 
-config = app_config()
-application = config.make_wsgi_app()
+
+class LazyApplication(object):
+    """WSGI application configuring the pyramid app on its first request
+
+    This keeps the configuration machinery out of the instance startup.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._app = None
+        self._lock = threading.Lock()
+
+    @property
+    def app(self):
+        if self._app is None:
+            with self._lock:
+                if self._app is None:
+                    self._app = self.factory()
+        return self._app
+
+    def __call__(self, environ, start_response):
+        return self.app(environ, start_response)
+
+
+application = LazyApplication(lambda: app_config().make_wsgi_app())
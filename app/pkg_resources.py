@@ -15,8 +15,11 @@ The package resource API is designed to work with normal filesystem packages,
 method.
 """
 
-import sys, os, zipimport, time, re, imp, types
+import sys, os, zipimport, time, re, imp, types, bisect
 from urlparse import urlparse, urlunparse
+from collections import deque, OrderedDict
+from hashlib import md5
+import threading
 
 try:
     frozenset
@@ -73,6 +76,8 @@ def __setstate__(state):
     g = globals()
     for k, v in state.iteritems():
         g['_sset_' + _state_vars[k]](k, g[k], v)
+    # registries were restored in place, drop lookups made against them
+    _clear_adapter_caches()
     return state
 
 def _sget_dict(val):
@@ -143,10 +148,10 @@ __all__ = [
     # Environmental control
     'declare_namespace', 'working_set', 'add_activation_listener',
     'find_distributions', 'set_extraction_path', 'cleanup_resources',
-    'get_default_cache',
+    'get_default_cache', 'set_resource_cache', 'resource_cache_info',
 
     # Primary implementation classes
-    'Environment', 'WorkingSet', 'ResourceManager',
+    'Environment', 'WorkingSet', 'ResourceManager', 'ResourceCache',
     'Distribution', 'Requirement', 'EntryPoint',
 
     # Exceptions
@@ -170,6 +175,7 @@ __all__ = [
     'NullProvider', 'EggProvider', 'DefaultProvider', 'ZipProvider',
     'register_finder', 'register_namespace_handler', 'register_loader_type',
     'fixup_namespace_packages', 'get_importer',
+    'register_namespace_map', 'load_namespace_map',
 
     # Deprecated/backward compatibility only
     'run_main', 'AvailableDistributions',
@@ -180,7 +186,11 @@ class ResolutionError(Exception):
         return self.__class__.__name__ + repr(self.args)
 
 class VersionConflict(ResolutionError):
-    """An already-installed version conflicts with the requested version"""
+    """An already-installed version conflicts with the requested version
+
+    ``WorkingSet.resolve()`` sets ``conflicts`` to the list of all
+    ``(dist, req)`` pairs found in conflict.
+    """
 
 class DistributionNotFound(ResolutionError):
     """A requested distribution was not found"""
@@ -189,6 +199,16 @@ class UnknownExtra(ResolutionError):
     """Distribution doesn't have an "extra feature" of the given name"""
 _provider_factories = {}
 
+# (id(registry), type) -> adapter, see _find_adapter()
+_adapter_cache = {}
+# module name -> (module, provider), see get_provider()
+_module_providers = {}
+
+def _clear_adapter_caches():
+    """Forget cached adapter lookups and module providers"""
+    _adapter_cache.clear()
+    _module_providers.clear()
+
 PY_MAJOR = sys.version[:3]
 EGG_DIST = 3
 BINARY_DIST = 2
@@ -204,9 +224,14 @@ def register_loader_type(loader_type, provider_factory):
     returns an ``IResourceProvider`` for that module.
     """
     _provider_factories[loader_type] = provider_factory
+    _clear_adapter_caches()
 
 def get_provider(moduleOrReq):
-    """Return an IResourceProvider for the named module or requirement"""
+    """Return an IResourceProvider for the named module or requirement
+
+    Providers of modules are cached for as long as the module stays the same
+    object in ``sys.modules``.
+    """
     if isinstance(moduleOrReq, Requirement):
         return working_set.find(moduleOrReq) or require(str(moduleOrReq))[0]
     try:
@@ -214,8 +239,17 @@ def get_provider(moduleOrReq):
     except KeyError:
         __import__(moduleOrReq)
         module = sys.modules[moduleOrReq]
+    try:
+        cached, provider = _module_providers[moduleOrReq]
+    except KeyError:
+        pass
+    else:
+        if cached is module:
+            return provider
     loader = getattr(module, '__loader__', None)
-    return _find_adapter(_provider_factories, loader)(module)
+    provider = _find_adapter(_provider_factories, loader)(module)
+    _module_providers[moduleOrReq] = module, provider
+    return provider
 
 def _macosx_vers(_cache=[]):
     if not _cache:
@@ -420,6 +454,15 @@ class IResourceProvider(IMetadataProvider):
 
 
 
+def _version_conflict(conflicts):
+    """VersionConflict for the first of `conflicts`, keeping all of them in
+    its ``conflicts`` attribute"""
+    # the first conflict is kept as args for backward compatibility
+    err = VersionConflict(*conflicts[0])
+    err.conflicts = conflicts
+    return err
+
+
 class WorkingSet(object):
     """A collection of active distributions on sys.path (or a similar list)"""
 
@@ -433,8 +476,12 @@ class WorkingSet(object):
         if entries is None:
             entries = sys.path
 
-        for entry in entries:
-            self.add_entry(entry)
+        if SCAN_THREADS > 1:
+            for entry, dists in _find_distributions_threaded(entries, True):
+                self._add_entry_dists(entry, dists)
+        else:
+            for entry in entries:
+                self.add_entry(entry)
 
 
     def add_entry(self, entry):
@@ -447,9 +494,12 @@ class WorkingSet(object):
         once, and the ``.entries`` of the ``sys.path`` WorkingSet should always
         equal ``sys.path``.)
         """
+        self._add_entry_dists(entry, find_distributions(entry, True))
+
+    def _add_entry_dists(self, entry, dists):
         self.entry_keys.setdefault(entry, [])
         self.entries.append(entry)
-        for dist in find_distributions(entry, True):
+        for dist in dists:
             self.add(dist, entry, False)
 
 
@@ -559,24 +609,31 @@ class WorkingSet(object):
         ``None``.
         """
 
-        requirements = list(requirements)[::-1]  # set up the stack
-        processed = {}  # set of processed requirements
+        requirements = deque(reversed(list(requirements)))
+        processed = set()  # set of processed requirements
         best = {}  # key -> dist
+        requires = {}  # (key, extras) -> reversed list of requirements
         to_activate = []
+        conflicts = []
 
         while requirements:
-            req = requirements.pop(0)   # process dependencies breadth-first
+            req = requirements.popleft()   # process dependencies breadth-first
             if _override_setuptools(req) and replacement:
                 req = Requirement.parse('distribute')
 
             if req in processed:
                 # Ignore cyclic or redundant dependencies
                 continue
+            processed.add(req)
             dist = best.get(req.key)
             if dist is None:
                 # Find the best distribution and add it to the map
                 dist = self.by_key.get(req.key)
                 if dist is None:
+                    if conflicts:
+                        # don't search or install dependencies which are
+                        # never activated
+                        raise _version_conflict(conflicts)
                     if env is None:
                         env = Environment(self.entries)
                     dist = best[req.key] = env.best_match(req, self, installer)
@@ -589,11 +646,19 @@ class WorkingSet(object):
                         # to get the name of the distribution here..
                         raise DistributionNotFound(req)
                 to_activate.append(dist)
-            if dist not in req:
+            if req.index and dist not in req:
                 # Oops, the "best" so far conflicts with a dependency
-                raise VersionConflict(dist, req) # XXX put more info here
-            requirements.extend(dist.requires(req.extras)[::-1])
-            processed[req] = True
+                conflicts.append((dist, req))
+                continue
+            try:
+                deps = requires[req.key, req.extras]
+            except KeyError:
+                deps = requires[req.key, req.extras] = \
+                    dist.requires(req.extras)[::-1]
+            requirements.extend(deps)
+
+        if conflicts:
+            raise _version_conflict(conflicts)
 
         return to_activate    # return list of distros to activate
 
@@ -743,8 +808,9 @@ class Environment(object):
         wish to map *all* distributions, not just those compatible with the
         running platform or Python version.
         """
-        self._distmap = {}
-        self._cache = {}
+        self._distmap = {}  # key -> newest-to-oldest list of distributions
+        self._index = {}    # key -> ascending list of their ``hashcmp``
+        self._versions = {} # key -> ascending list of their parsed versions
         self.platform = platform
         self.python = python
         self.scan(search_path)
@@ -763,6 +829,9 @@ class Environment(object):
     def remove(self, dist):
         """Remove `dist` from the environment"""
         self._distmap[dist.key].remove(dist)
+        index = self._index[dist.key]
+        i = bisect.bisect_left(index, dist.hashcmp)
+        del index[i], self._versions[dist.key][i]
 
     def scan(self, search_path=None):
         """Scan `search_path` for distributions usable in this environment
@@ -775,34 +844,39 @@ class Environment(object):
         if search_path is None:
             search_path = sys.path
 
-        for item in search_path:
-            for dist in find_distributions(item):
-                self.add(dist)
+        if SCAN_THREADS > 1:
+            for item, dists in _find_distributions_threaded(search_path):
+                for dist in dists:
+                    self.add(dist)
+        else:
+            for item in search_path:
+                for dist in find_distributions(item):
+                    self.add(dist)
 
     def __getitem__(self, project_name):
         """Return a newest-to-oldest list of distributions for `project_name`
+
+        The list is kept sorted as distributions are added; use ``remove()``
+        rather than modifying it.
         """
         try:
-            return self._cache[project_name]
+            return self._distmap[project_name]
         except KeyError:
-            project_name = project_name.lower()
-            if project_name not in self._distmap:
-                return []
-
-        if project_name not in self._cache:
-            dists = self._cache[project_name] = self._distmap[project_name]
-            _sort_dists(dists)
-
-        return self._cache[project_name]
+            return self._distmap.get(project_name.lower(), [])
 
     def add(self, dist):
         """Add `dist` if we ``can_add()`` it and it isn't already added"""
         if self.can_add(dist) and dist.has_version():
-            dists = self._distmap.setdefault(dist.key, [])
-            if dist not in dists:
-                dists.append(dist)
-                if dist.key in self._cache:
-                    _sort_dists(self._cache[dist.key])
+            key = dist.key
+            dists = self._distmap.setdefault(key, [])
+            index = self._index.setdefault(key, [])
+            hashcmp = dist.hashcmp
+            i = bisect.bisect_left(index, hashcmp)
+            if i < len(index) and index[i] == hashcmp:
+                return      # already added
+            index.insert(i, hashcmp)
+            self._versions.setdefault(key, []).insert(i, hashcmp[0])
+            dists.insert(len(dists) - i, dist)
 
 
     def best_match(self, req, working_set, installer=None):
@@ -821,7 +895,17 @@ class Environment(object):
         dist = working_set.find(req)
         if dist is not None:
             return dist
-        for dist in self[req.key]:
+        dists = self[req.key]
+        start, end = 0, len(dists)
+        if req.index and dists:
+            # skip the versions above or below all specs if they can't match
+            versions = self._versions[req.key]
+            if not _contains_all(req, 1):
+                start = len(dists) - \
+                    bisect.bisect_right(versions, req.index[-1][0])
+            if not _contains_all(req, -1):
+                end = len(dists) - bisect.bisect_left(versions, req.index[0][0])
+        for dist in dists[start:end]:
             if dist in req:
                 return dist
         return self.obtain(req, installer) # try and download/install
@@ -887,9 +971,107 @@ class ExtractionError(RuntimeError):
 
 
 
+class ResourceCache(object):
+    """Size-bounded LRU of resource contents
+
+    Entries are keyed by the provider's module path and the resource name.
+    With `validate` the mtime of filesystem resources is checked on every
+    hit, otherwise cached contents are trusted until they are evicted.
+    """
+
+    def __init__(self, max_bytes, validate=True):
+        self.max_bytes = max_bytes
+        self.validate = validate
+        self.hits = self.misses = self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _stat(self, provider, resource_name):
+        """``os.stat()`` of a filesystem resource, ``None`` for others"""
+        if isinstance(provider, DefaultProvider):
+            try:
+                return os.stat(
+                    provider._fn(provider.module_path, resource_name)
+                )
+            except OSError:
+                pass    # let the provider report the missing resource
+        return None
+
+    def _lookup(self, key, mtime):
+        """Return the cached contents of `key` or ``None`` on a miss"""
+        self._lock.acquire()
+        try:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                if not self.validate or entry[1] == mtime:
+                    self._entries[key] = entry  # most recently used
+                    self.hits += 1
+                    return entry[0]
+                self.bytes -= len(entry[0])
+            self.misses += 1
+        finally:
+            self._lock.release()
+        return None
+
+    def _load(self, provider, manager, resource_name, key, mtime):
+        data = provider.get_resource_string(manager, resource_name)
+        if len(data) <= self.max_bytes:
+            self._lock.acquire()
+            try:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self.bytes -= len(entry[0])
+                self._entries[key] = data, mtime
+                self.bytes += len(data)
+                while self.bytes > self.max_bytes:
+                    key, entry = self._entries.popitem(last=False)
+                    self.bytes -= len(entry[0])
+            finally:
+                self._lock.release()
+        return data
+
+    def get(self, provider, manager, resource_name):
+        """Return the contents of `resource_name` from `provider`"""
+        key = (getattr(provider, 'module_path', id(provider)), resource_name)
+        st = self.validate and self._stat(provider, resource_name) or None
+        mtime = st and st.st_mtime
+        data = self._lookup(key, mtime)
+        if data is None:
+            data = self._load(provider, manager, resource_name, key, mtime)
+        return data
+
+    def get_stream(self, provider, manager, resource_name):
+        """Return a file-like object for `resource_name` from `provider`
+
+        Filesystem resources larger than the cache are streamed by the
+        provider instead of being read into memory.  Without `validate`
+        their size is only checked on a miss.
+        """
+        key = (getattr(provider, 'module_path', id(provider)), resource_name)
+        st = self.validate and self._stat(provider, resource_name) or None
+        mtime = st and st.st_mtime
+        data = self._lookup(key, mtime)
+        if data is None:
+            if not self.validate:
+                st = self._stat(provider, resource_name)
+            if st is not None and st.st_size > self.max_bytes:
+                return provider.get_resource_stream(manager, resource_name)
+            data = self._load(provider, manager, resource_name, key, mtime)
+        return StringIO(data)
+
+    def info(self):
+        """Return the cache statistics as a dictionary"""
+        return {
+            'hits': self.hits, 'misses': self.misses,
+            'entries': len(self._entries), 'bytes': self.bytes,
+            'max_bytes': self.max_bytes, 'validate': self.validate,
+        }
+
+
 class ResourceManager:
     """Manage resource extraction and packages"""
     extraction_path = None
+    resource_cache = None
 
     def __init__(self):
         self.cached_files = {}
@@ -912,15 +1094,38 @@ class ResourceManager:
 
     def resource_stream(self, package_or_requirement, resource_name):
         """Return a readable file-like object for specified resource"""
-        return get_provider(package_or_requirement).get_resource_stream(
-            self, resource_name
-        )
+        provider = get_provider(package_or_requirement)
+        if self.resource_cache is not None:
+            return self.resource_cache.get_stream(
+                provider, self, resource_name
+            )
+        return provider.get_resource_stream(self, resource_name)
 
     def resource_string(self, package_or_requirement, resource_name):
         """Return specified resource as a string"""
-        return get_provider(package_or_requirement).get_resource_string(
-            self, resource_name
-        )
+        provider = get_provider(package_or_requirement)
+        if self.resource_cache is not None:
+            return self.resource_cache.get(provider, self, resource_name)
+        return provider.get_resource_string(self, resource_name)
+
+    def set_resource_cache(self, max_bytes, validate=True):
+        """Keep up to `max_bytes` of resource contents in memory
+
+        ``resource_string()`` and ``resource_stream()`` are then served from
+        a ``ResourceCache``.  Pass `validate` to check the mtime of cached
+        filesystem resources (useful in development); without it cached
+        contents are trusted.  A `max_bytes` of 0 disables the cache.
+        """
+        if max_bytes:
+            self.resource_cache = ResourceCache(max_bytes, validate)
+        else:
+            self.resource_cache = None
+
+    def resource_cache_info(self):
+        """Statistics of the resource cache, or ``None`` if it is disabled"""
+        if self.resource_cache is None:
+            return None
+        return self.resource_cache.info()
 
     def resource_listdir(self, package_or_requirement, resource_name):
         """List the contents of the named resource directory"""
@@ -1697,6 +1902,7 @@ def register_finder(importer_type, distribution_finder):
     item and the importer instance, yields ``Distribution`` instances found on
     that path item.  See ``pkg_resources.find_on_path`` for an example."""
     _distribution_finders[importer_type] = distribution_finder
+    _clear_adapter_caches()
 
 
 def find_distributions(path_item, only=False):
@@ -1705,6 +1911,50 @@ def find_distributions(path_item, only=False):
     finder = _find_adapter(_distribution_finders, importer)
     return finder(importer, path_item, only)
 
+# number of threads used to find the distributions of all path items when
+# constructing a WorkingSet or scanning an Environment; opt in with the
+# PKG_RESOURCES_SCAN_THREADS environment variable, 0 scans sequentially
+SCAN_THREADS = int(os.environ.get('PKG_RESOURCES_SCAN_THREADS', 0))
+
+def _find_distributions_threaded(path_items, only=False, threads=None):
+    """Yield ``(path_item, dists)`` for `path_items`, in their order
+
+    The distributions of each distinct path item are found concurrently in
+    up to `threads` (default ``SCAN_THREADS``) threads.  An error finding
+    them is raised when its path item is reached in the result.
+    """
+    path_items = list(path_items)
+    found = {}
+    pending = list(set(path_items))
+
+    def worker():
+        while True:
+            try:
+                path_item = pending.pop()
+            except IndexError:
+                return
+            try:
+                found[path_item] = True, list(
+                    find_distributions(path_item, only)
+                )
+            except Exception:
+                found[path_item] = False, sys.exc_info()
+
+    workers = [
+        threading.Thread(target=worker)
+        for i in range(min(threads or SCAN_THREADS, len(pending)))
+    ]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    for path_item in path_items:
+        ok, value = found[path_item]
+        if not ok:
+            raise value[0], value[1], value[2]
+        yield path_item, value
+
 def find_in_zip(importer, path_item, only=False):
     metadata = EggMetadata(importer)
     if metadata.has_metadata('PKG-INFO'):
@@ -1732,41 +1982,105 @@ def find_nothing(importer, path_item, only=False):
     return ()
 register_finder(object, find_nothing)
 
+# path item -> (mtime, entries, egg-link (mtime, target) by path), see
+# _scan_path_item() and _egg_link_target()
+_path_item_cache = {}
+
+def _scan_path_item(path_item):
+    """Return ``(kind, entry, fullpath)`` for the distributions in a directory
+
+    `kind` is ``'dir'`` or ``'file'`` for ``.egg-info``/``.dist-info``
+    metadata, ``'egg'`` or ``'link'``.  ``None`` is returned if `path_item`
+    is not a readable directory.  Listings are cached per process and
+    revalidated by the mtime of the directory.
+    """
+    try:
+        mtime = os.stat(path_item).st_mtime
+        cached = _path_item_cache[path_item]
+    except OSError:
+        return None
+    except KeyError:
+        pass
+    else:
+        if cached[0] == mtime:
+            return cached[1]
+    try:
+        names = os.listdir(path_item)
+    except OSError:
+        return None     # not a directory or not readable
+    entries = []
+    for entry in names:
+        lower = entry.lower()
+        fullpath = os.path.join(path_item, entry)
+        if lower.endswith('.egg-info') or lower.endswith('.dist-info'):
+            kind = os.path.isdir(fullpath) and 'dir' or 'file'
+        elif lower.endswith('.egg'):
+            kind = 'egg'
+        elif lower.endswith('.egg-link'):
+            kind = 'link'
+        else:
+            continue
+        entries.append((kind, entry, fullpath))
+    _path_item_cache[path_item] = mtime, entries, {}
+    return entries
+
+def _egg_link_target(path_item, fullpath):
+    """Return the path an ``.egg-link`` file points to, or ``None``
+
+    Targets are cached by the mtime of the link file, which is rewritten in
+    place by ``setup.py develop``.
+    """
+    links = _path_item_cache[path_item][2]
+    mtime = os.stat(fullpath).st_mtime
+    cached = links.get(fullpath)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    target = None
+    for line in open(fullpath):
+        if line.strip():
+            target = os.path.join(path_item, line.rstrip())
+            break
+    links[fullpath] = mtime, target
+    return target
+
 def find_on_path(importer, path_item, only=False):
     """Yield distributions accessible on a sys.path directory"""
     path_item = _normalize_cached(path_item)
 
-    if os.path.isdir(path_item) and os.access(path_item, os.R_OK):
-        if path_item.lower().endswith('.egg'):
+    if path_item.lower().endswith('.egg'):
+        if os.path.isdir(path_item) and os.access(path_item, os.R_OK):
             # unpacked egg
             yield Distribution.from_filename(
                 path_item, metadata=PathMetadata(
                     path_item, os.path.join(path_item, 'EGG-INFO')
                 )
             )
+        return
+
+    # scan for .egg and .egg-info in directory
+    for kind, entry, fullpath in _scan_path_item(path_item) or ():
+        if kind == 'dir':
+            # egg-info directory, allow getting metadata
+            metadata = PathMetadata(path_item, fullpath)
+            yield Distribution.from_location(
+                path_item, entry, metadata, precedence=DEVELOP_DIST
+            )
+        elif kind == 'file':
+            metadata = FileMetadata(fullpath)
+            yield Distribution.from_location(
+                path_item, entry, metadata, precedence=DEVELOP_DIST
+            )
+        elif only:
+            continue    # don't yield nested distros
+        elif kind == 'egg':
+            for dist in find_distributions(fullpath):
+                yield dist
         else:
-            # scan for .egg and .egg-info in directory
-            for entry in os.listdir(path_item):
-                lower = entry.lower()
-                if lower.endswith('.egg-info') or lower.endswith('.dist-info'):
-                    fullpath = os.path.join(path_item, entry)
-                    if os.path.isdir(fullpath):
-                        # egg-info directory, allow getting metadata
-                        metadata = PathMetadata(path_item, fullpath)
-                    else:
-                        metadata = FileMetadata(fullpath)
-                    yield Distribution.from_location(
-                        path_item, entry, metadata, precedence=DEVELOP_DIST
-                    )
-                elif not only and lower.endswith('.egg'):
-                    for dist in find_distributions(os.path.join(path_item, entry)):
-                        yield dist
-                elif not only and lower.endswith('.egg-link'):
-                    for line in open(os.path.join(path_item, entry)):
-                        if not line.strip(): continue
-                        for item in find_distributions(os.path.join(path_item, line.rstrip())):
-                            yield item
-                        break
+            target = _egg_link_target(path_item, fullpath)
+            if target is not None:
+                for item in find_distributions(target):
+                    yield item
+
 register_finder(ImpWrapper, find_on_path)
 
 try:
@@ -1779,6 +2093,7 @@ else:
 
 _declare_state('dict', _namespace_handlers={})
 _declare_state('dict', _namespace_packages={})
+_declare_state('dict', _namespace_map={})
 
 
 def register_namespace_handler(importer_type, namespace_handler):
@@ -1797,6 +2112,68 @@ def register_namespace_handler(importer_type, namespace_handler):
     ``pkg_resources.file_ns_handler``.
     """
     _namespace_handlers[importer_type] = namespace_handler
+    _clear_adapter_caches()
+
+def register_namespace_map(mapping, path_items=()):
+    """Register the path items contributing to namespace packages
+
+    `mapping` maps a namespace package name to the path items providing a
+    portion of it, i.e. ``{'zope': ['distlib']}``, as found by scanning the
+    `path_items` for top-level packages and the mapped items of the parent
+    for nested ones.  Such a map is computed once at deploy time;
+    ``declare_namespace()`` and ``fixup_namespace_packages()`` then skip
+    the scanned path items not listed for a mapped package instead of asking
+    their importers.  Path items which were not scanned, i.e. added to
+    ``sys.path`` by the dev server, are handled as usual.
+    """
+    path_items = [_normalize_cached(item) for item in path_items]
+    for packageName, items in mapping.items():
+        parent = packageName.rpartition('.')[0]
+        if parent:
+            # the parent's portions, its __path__ entries
+            scanned = [os.path.join(item, parent.rpartition('.')[2])
+                       for item in mapping.get(parent, ())]
+        else:
+            scanned = path_items
+        _namespace_map[packageName] = (
+            frozenset([_normalize_cached(item) for item in scanned]),
+            frozenset([_normalize_cached(item) for item in items]),
+        )
+
+def load_namespace_map(filename):
+    """Register the namespace map stored in `filename`
+
+    The file lists the scanned path items before a ``[package]`` section
+    per namespace package, which lists the contributing path items, one per
+    line.  Path items are relative to the file's directory.
+    """
+    base = os.path.dirname(os.path.abspath(filename))
+    f = open(filename)
+    try:
+        mapping = {}
+        path_items = []
+        for packageName, items in split_sections(f.read()):
+            items = [os.path.join(base, item) for item in items]
+            if packageName:
+                mapping[packageName] = items
+            else:
+                path_items = items
+    finally:
+        f.close()
+    register_namespace_map(mapping, path_items)
+
+def _namespace_path_items(packageName, path):
+    """Filter `path` by the namespace map entry of `packageName`, if any"""
+    try:
+        scanned, contributing = _namespace_map[packageName]
+    except KeyError:
+        return path
+    result = []
+    for item in path:
+        normalized = _normalize_cached(item)
+        if normalized not in scanned or normalized in contributing:
+            result.append(item)
+    return result
 
 def _handle_ns(packageName, path_item):
     """Ensure that named package includes a subpath of path_item (if needed)"""
@@ -1843,7 +2220,7 @@ def declare_namespace(packageName):
         _namespace_packages.setdefault(parent, []).append(packageName)
         _namespace_packages.setdefault(packageName, [])
 
-        for path_item in path:
+        for path_item in _namespace_path_items(packageName, path):
             # Ensure all the parent's path items are reflected in the child,
             # if they apply
             _handle_ns(packageName, path_item)
@@ -1856,6 +2233,8 @@ def fixup_namespace_packages(path_item, parent=None):
     imp.acquire_lock()
     try:
         for package in _namespace_packages.get(parent, ()):
+            if not _namespace_path_items(package, [path_item]):
+                continue
             subpath = _handle_ns(package, path_item)
             if subpath: fixup_namespace_packages(subpath, package)
     finally:
@@ -1910,8 +2289,53 @@ def _set_parent_ns(packageName):
         setattr(sys.modules[parent], name, sys.modules[packageName])
 
 
+# upper bound of texts kept by the memoized parsers, see _memoized_parse()
+PARSE_CACHE_SIZE = 512
+_parse_cache = {}
+
+def _content_key(strs):
+    """Digest of `strs` if it is a string or a list or tuple of strings"""
+    if isinstance(strs, (list, tuple)):
+        for s in strs:
+            if not isinstance(s, basestring):
+                return None
+        strs = '\n'.join(strs)
+    elif not isinstance(strs, basestring):
+        return None
+    if isinstance(strs, unicode):
+        return True, md5(strs.encode('utf-8')).digest()
+    return False, md5(strs).digest()
+
+def _memoized_parse(kind, strs, parse):
+    """Return ``parse(strs)`` memoized by `kind` and the content of `strs`
+
+    ``None`` is returned if `strs` can't be digested (i.e. a generator) or
+    parsing fails; callers then fall back to their lazy parser, which
+    reports the error when it is reached.
+    """
+    key = _content_key(strs)
+    if key is None:
+        return None
+    key = kind, key
+    try:
+        return _parse_cache[key]
+    except KeyError:
+        pass
+    try:
+        result = parse(strs)
+    except ValueError:
+        return None
+    if len(_parse_cache) >= PARSE_CACHE_SIZE:
+        _parse_cache.popitem()
+    _parse_cache[key] = result
+    return result
+
 def yield_lines(strs):
-    """Yield non-empty/non-comment lines of a ``basestring`` or sequence"""
+    """Yield non-empty/non-comment lines of a ``basestring`` or sequence
+
+    Not memoized, digesting the text costs more than splitting it. The
+    memoized parsers below call it on a cache miss only.
+    """
     if isinstance(strs, basestring):
         for s in strs.splitlines():
             s = s.strip()
@@ -1930,6 +2354,9 @@ COMMA = re.compile(r"\s*,").match               # comma between items
 OBRACKET = re.compile(r"\s*\[").match
 CBRACKET = re.compile(r"\s*\]").match
 MODULE = re.compile(r"\w+(\.\w+)*$").match
+SIMPLE_REQUIREMENT = re.compile(        # project with at most one version spec
+    r"((?:\w|[-.])+)\s*(?:(<=?|>=?|==|!=)\s*((?:\w|[-.])+))?\s*(?:#.*)?$"
+).match
 EGG_NAME = re.compile(
     r"(?P<name>[^-]+)"
     r"( -(?P<ver>[^-]+) (-py(?P<pyver>[^-]+) (-(?P<plat>.+))? )? )?",
@@ -1939,19 +2366,40 @@ EGG_NAME = re.compile(
 component_re = re.compile(r'(\d+ | [a-z]+ | \.| -)', re.VERBOSE)
 replace = {'pre':'c', 'preview':'c', '-':'final-', 'rc':'c', 'dev':'@'}.get
 
+def _intern(s):
+    try:
+        return intern(s)
+    except TypeError:
+        # unicode parts can not be interned
+        return s
+
 def _parse_version_parts(s):
     for part in component_re.split(s):
         part = replace(part, part)
         if part in ['', '.']:
             continue
         if part[:1] in '0123456789':
-            yield part.zfill(8)    # pad for numeric comparison
+            yield _intern(part.zfill(8))    # pad for numeric comparison
         else:
-            yield '*' + part
+            yield _intern('*' + part)
 
     yield '*final'  # ensure that alpha/beta/candidate are before final
 
-def parse_version(s):
+def _parse_version(s):
+    """Uncached implementation of ``parse_version()``"""
+    parts = []
+    for part in _parse_version_parts(s.lower()):
+        if part.startswith('*'):
+            # remove trailing zeros from each series of numeric parts
+            while parts and parts[-1] == '00000000':
+                parts.pop()
+        parts.append(part)
+    return tuple(parts)
+
+# upper bound of distinct version strings kept by ``parse_version()``
+PARSE_VERSION_CACHE_SIZE = 2048
+
+def parse_version(s, _cache={}):
     """Convert a version string to a chronologically-sortable key
 
     This is a rough cross between distutils' StrictVersion and LooseVersion;
@@ -1981,19 +2429,29 @@ def parse_version(s):
     candidates, and therefore are not as new as a version string that does not
     contain them, and "dev" is replaced with an '@' so that it sorts lower than
     than any other pre-release tag.
+
+    Results are memoized per version string.  The parts of the returned
+    tuples are interned, so keys of equal components share their strings.
     """
-    parts = []
-    for part in _parse_version_parts(s.lower()):
-        if part.startswith('*'):
-            # remove trailing zeros from each series of numeric parts
-            while parts and parts[-1] == '00000000':
-                parts.pop()
-        parts.append(part)
-    return tuple(parts)
+    try:
+        return _cache[s]
+    except KeyError:
+        pass
+    if len(_cache) >= PARSE_VERSION_CACHE_SIZE:
+        _cache.popitem()
+    _cache[s] = result = _parse_version(s)
+    return result
 
 class EntryPoint(object):
     """Object representing an advertised importable object"""
 
+    # set to False to skip resolving the distribution's requirements on
+    # load(), i.e. in production where all distributions are installed
+    require_on_load = True
+
+    # (working_set, target, required) of the last load()
+    _loaded = None
+
     def __init__(self, name, module_name, attrs=(), extras=(), dist=None):
         if not MODULE(module_name):
             raise ValueError("Invalid module name", module_name)
@@ -2015,6 +2473,18 @@ class EntryPoint(object):
         return "EntryPoint.parse(%r)" % str(self)
 
     def load(self, require=True, env=None, installer=None):
+        """Import and return the advertised object
+
+        The object is memoized for the current ``working_set``; requirements
+        are only resolved on the first load.
+        """
+        require = require and self.require_on_load
+        loaded = self._loaded
+        if loaded is not None and loaded[0] is working_set:
+            if require and not loaded[2]:
+                self.require(env, installer)
+                self._loaded = working_set, loaded[1], True
+            return loaded[1]
         if require: self.require(env, installer)
         entry = __import__(self.module_name, globals(), globals(), ['__name__'])
         for attr in self.attrs:
@@ -2022,6 +2492,7 @@ class EntryPoint(object):
                 entry = getattr(entry, attr)
             except AttributeError:
                 raise ImportError("%r has no %r attribute" % (entry, attr))
+        self._loaded = working_set, entry, require
         return entry
 
     def require(self, env=None, installer=None):
@@ -2091,6 +2562,33 @@ class EntryPoint(object):
     #@classmethod
     def parse_map(cls, data, dist=None):
         """Parse a map of entry point groups"""
+        specs = _memoized_parse('entry_points', data, cls._parse_map_specs)
+        if specs is None:
+            return cls._parse_map(data, dist)
+        maps = {}
+        for group, entry_points in specs:
+            maps[group] = this = {}
+            for name, module_name, attrs, extras in entry_points:
+                this[name] = cls(name, module_name, attrs, extras, dist)
+        return maps
+
+    parse_map = classmethod(parse_map)
+
+    #@classmethod
+    def _parse_map_specs(cls, data):
+        """Entry point map of `data` as nested tuples, for memoizing"""
+        return tuple([
+            (group, tuple([
+                (ep.name, ep.module_name, ep.attrs, ep.extras)
+                for ep in this.values()
+            ]))
+            for group, this in cls._parse_map(data).items()
+        ])
+
+    _parse_map_specs = classmethod(_parse_map_specs)
+
+    #@classmethod
+    def _parse_map(cls, data, dist=None):
         if isinstance(data, dict):
             data = data.items()
         else:
@@ -2107,7 +2605,7 @@ class EntryPoint(object):
             maps[group] = cls.parse_group(group, lines, dist)
         return maps
 
-    parse_map = classmethod(parse_map)
+    _parse_map = classmethod(_parse_map)
 
 
 def _remove_md5_fragment(location):
@@ -2123,6 +2621,15 @@ class Distribution(object):
     """Wrap an actual or potential sys.path entry w/metadata"""
     PKG_INFO = 'PKG-INFO'
 
+    # compact storage for the attributes every distribution has or computes
+    # lazily; __dict__ is kept (and only allocated when used) for others
+    __slots__ = (
+        'project_name', 'py_version', 'platform', 'location', 'precedence',
+        '_provider', '_version', '_key', '_parsed_version', '_ep_map',
+        '_metadata', '_metadata_names', '_requires', '__dep_map', '__dict__',
+        '__weakref__',
+    )
+
     def __init__(self,
         location=None, metadata=None, project_name=None, version=None,
         py_version=PY_MAJOR, platform=None, precedence=EGG_DIST
@@ -2136,6 +2643,26 @@ class Distribution(object):
         self.precedence = precedence
         self._provider = metadata or empty_provider
 
+    def __getstate__(self):
+        # slots aren't pickled by protocols 0 and 1, collect them by hand
+        state = {}
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if name in ('__dict__', '__weakref__'):
+                    continue
+                if name.startswith('__'):
+                    name = '_%s%s' % (cls.__name__.lstrip('_'), name)
+                try:
+                    state[name] = getattr(self, name)
+                except AttributeError:
+                    pass
+        state.update(getattr(self, '__dict__', ()))
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
     #@classmethod
     def from_location(cls, location, basename, metadata=None, **kw):
         project_name, version, py_version, platform = [None] * 4
@@ -2238,6 +2765,13 @@ class Distribution(object):
 
     def requires(self, extras=()):
         """List of Requirements needed for this distro if `extras` are used"""
+        extras = tuple(extras)
+        try:
+            return list(self._requires[extras])
+        except AttributeError:
+            self._requires = {}
+        except KeyError:
+            pass
         dm = self._dep_map
         deps = []
         deps.extend(dm.get(None, ()))
@@ -2248,12 +2782,49 @@ class Distribution(object):
                 raise UnknownExtra(
                     "%s has no such extra feature %r" % (self, ext)
                 )
+        self._requires[extras] = tuple(deps)
         return deps
 
     def _get_metadata(self, name):
-        if self.has_metadata(name):
-            for line in self.get_metadata_lines(name):
-                yield line
+        """Lines of metadata file `name`, cached except for PKG-INFO"""
+        if name == self.PKG_INFO:
+            return self._read_metadata(name)
+        try:
+            return self._metadata[name]
+        except AttributeError:
+            self._metadata = {}
+        except KeyError:
+            pass
+        lines = self._metadata[name] = tuple(self._read_metadata(name))
+        return lines
+
+    def _read_metadata(self, name):
+        names = self._get_metadata_names()
+        if names is None:
+            if not self.has_metadata(name):
+                return
+        elif name not in names:
+            return
+        for line in self.get_metadata_lines(name):
+            yield line
+
+    def _get_metadata_names(self):
+        """Names in the metadata directory, listed once instead of checking
+        each metadata file, or ``None`` if the provider has no directory.
+        """
+        try:
+            return self._metadata_names
+        except AttributeError:
+            pass
+        names = None
+        provider = self._provider
+        if isinstance(provider, DefaultProvider) and provider.egg_info:
+            try:
+                names = frozenset(os.listdir(provider.egg_info))
+            except OSError:
+                pass
+        self._metadata_names = names
+        return names
 
     def activate(self, path=None):
         """Ensure distribution is importable on `path` (default=sys.path)"""
@@ -2452,6 +3023,8 @@ class DistInfoDistribution(Distribution):
     PKG_INFO = 'METADATA'
     EQEQ = re.compile(r"([\(,])\s*(\d.*?)\s*([,\)])")
 
+    __slots__ = ('_pkg_info', '__dep_map')
+
     @property
     def _parsed_pkg_info(self):
         """Parse and cache metadata"""
@@ -2484,23 +3057,15 @@ class DistInfoDistribution(Distribution):
 
     def _compute_dependencies(self):
         """Recompute this distribution's dependencies."""
-        def dummy_marker(marker):
-            def marker_fn(environment=None, override=None):
-                return True
-            marker_fn.__doc__ = marker
-            return marker_fn
-        try:
-            from markerlib import as_function
-        except ImportError:
-            as_function = dummy_marker
         dm = self.__dep_map = {None: []}
 
         reqs = []
         # Including any condition expressions
         for req in self._parsed_pkg_info.get_all('Requires-Dist') or []:
             distvers, mark = self._preparse_requirement(req)
-            parsed = parse_requirements(distvers).next()
-            parsed.marker_fn = as_function(mark)
+            # not memoized, the marker function is set on the requirement
+            parsed = _parse_requirements(distvers).next()
+            parsed.marker_fn = _marker_function(mark)
             reqs.append(parsed)
 
         def reqs_for_extra(extra):
@@ -2518,6 +3083,26 @@ class DistInfoDistribution(Distribution):
         return dm
 
 
+def _dummy_marker(marker):
+    def marker_fn(environment=None, override=None):
+        return True
+    marker_fn.__doc__ = marker
+    return marker_fn
+
+def _marker_function(marker, _cache={}):
+    """Compile environment `marker` to a function, memoized per marker"""
+    try:
+        return _cache[marker]
+    except KeyError:
+        pass
+    try:
+        from markerlib import as_function
+    except ImportError:
+        as_function = _dummy_marker
+    _cache[marker] = marker_fn = as_function(marker)
+    return marker_fn
+
+
 _distributionImpl = {'.egg': Distribution,
                      '.egg-info': Distribution,
                      '.dist-info': DistInfoDistribution }
@@ -2562,8 +3147,31 @@ def parse_requirements(strs):
     """Yield ``Requirement`` objects for each specification in `strs`
 
     `strs` must be an instance of ``basestring``, or a (possibly-nested)
-    iterable thereof.
+    iterable thereof.  Results for strings and lists of strings are memoized
+    by content, so don't modify the yielded requirements.
     """
+    reqs = _memoized_parse('requirements', strs, _parse_simple_requirements)
+    if reqs is None:
+        return _parse_requirements(strs)
+    return iter(reqs)
+
+def _parse_simple_requirements(strs):
+    """Tuple of the requirements in `strs`, matching each line at once
+
+    Only lines with at most one version spec are handled here; any other
+    line hands all of `strs` to ``_parse_requirements()``.
+    """
+    reqs = []
+    for line in yield_lines(strs):
+        match = SIMPLE_REQUIREMENT(line)
+        if match is None:
+            return tuple(_parse_requirements(strs))
+        project_name, op, version = match.groups()
+        specs = op and [(op, safe_version(version))] or []
+        reqs.append(Requirement(project_name, specs, []))
+    return tuple(reqs)
+
+def _parse_requirements(strs):
     # create a steppable iterator, so we can handle \-continuations
     lines = iter(yield_lines(strs))
 
@@ -2619,10 +3227,6 @@ def parse_requirements(strs):
         yield Requirement(project_name, specs, extras)
 
 
-def _sort_dists(dists):
-    tmp = [(dist.hashcmp, dist) for dist in dists]
-    tmp.sort()
-    dists[::-1] = [d for hc, d in tmp]
 
 
 
@@ -2689,6 +3293,22 @@ class Requirement:
 
     #@staticmethod
     def parse(s, replacement=True):
+        if isinstance(s, basestring):
+            try:
+                return _requirement_cache[s, replacement]
+            except KeyError:
+                pass
+            if len(_requirement_cache) >= REQUIREMENT_CACHE_SIZE:
+                _requirement_cache.popitem()
+            req = _requirement_cache[s, replacement] = \
+                Requirement._parse(s, replacement)
+            return req
+        return Requirement._parse(s, replacement)
+
+    parse = staticmethod(parse)
+
+    #@staticmethod
+    def _parse(s, replacement=True):
         reqs = list(parse_requirements(s))
         if reqs:
             if len(reqs) == 1:
@@ -2707,7 +3327,28 @@ class Requirement:
             raise ValueError("Expected only one requirement", s)
         raise ValueError("No requirements found", s)
 
-    parse = staticmethod(parse)
+    _parse = staticmethod(_parse)
+
+# upper bound of requirement strings kept by ``Requirement.parse()``
+REQUIREMENT_CACHE_SIZE = 1024
+_requirement_cache = {}
+
+def _contains_all(req, compare):
+    """Does `req` contain the versions comparing as `compare` to all specs?
+
+    With `compare` 1 this answers for every version above the highest spec,
+    with -1 for every version below the lowest spec, following the rules of
+    ``Requirement.__contains__()``.
+    """
+    last = None
+    for parsed, trans, op, ver in req.index:
+        action = trans[compare]
+        if action == 'F':     return False
+        elif action == 'T':   return True
+        elif action == '+':   last = True
+        elif action == '-' or last is None:   last = False
+    if last is None: last = True    # no rules encountered
+    return last
 
 state_machine = {
     #       =><
@@ -2748,10 +3389,22 @@ def _get_mro(cls):
     return cls.__mro__
 
 def _find_adapter(registry, ob):
-    """Return an adapter factory for `ob` from `registry`"""
-    for t in _get_mro(getattr(ob, '__class__', type(ob))):
+    """Return an adapter factory for `ob` from `registry`
+
+    Lookups are cached per type; the ``register_*`` functions clear the cache.
+    """
+    cls = getattr(ob, '__class__', type(ob))
+    try:
+        return _adapter_cache[id(registry), cls]
+    except KeyError:
+        pass
+    adapter = None
+    for t in _get_mro(cls):
         if t in registry:
-            return registry[t]
+            adapter = registry[t]
+            break
+    _adapter_cache[id(registry), cls] = adapter
+    return adapter
 
 
 def ensure_directory(path):
@@ -2768,6 +3421,14 @@ def split_sections(s):
     comment-only lines.  If there are any such lines before the first section
     header, they're returned in a first ``section`` of ``None``.
     """
+    sections = _memoized_parse('sections', s, lambda s: tuple([
+        (section, tuple(content)) for section, content in _split_sections(s)
+    ]))
+    if sections is None:
+        return _split_sections(s)
+    return iter([(section, list(content)) for section, content in sections])
+
+def _split_sections(s):
     section = None
     content = []
     for line in yield_lines(s):
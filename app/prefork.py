@@ -0,0 +1,160 @@
+"""Prefork WSGI server running the app outside of appengine::
+
+    ./bin/python-gae app/prefork.py --store sqlite:/var/lib/example/nodes.db
+
+The master imports ``main`` and configures the application before forking,
+so the workers share the loaded modules copy-on-write. It writes the nodes
+of the store to a cache file every ``--cache-refresh`` seconds, the workers
+map that file and look nodes up there first, see ``example_app.nodecache``.
+"""
+import os
+import sys
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+os.chdir(APP_DIR)
+sys.path.insert(0, APP_DIR)
+
+import errno
+import gc
+import logging
+import multiprocessing
+from optparse import OptionParser
+import signal
+import tempfile
+import time
+from wsgiref.simple_server import make_server
+
+log = logging.getLogger('prefork')
+
+
+class Master(object):
+    """Fork the workers serving `server`, restart the ones that died and
+    refresh the node cache.
+    """
+
+    def __init__(self, server, workers, store=None, writer=None,
+                 refresh=30.0):
+        self.server = server
+        self.workers = workers
+        self.store = store
+        self.writer = writer
+        self.refresh = refresh
+        self.pids = set()
+        self.running = True
+
+    def spawn(self):
+        pid = os.fork()
+        if pid:
+            self.pids.add(pid)
+            return
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os._exit(0)
+
+    def write_cache(self):
+        if self.writer is not None:
+            count = self.writer.write(self.store.iter_nodes())
+            log.debug('wrote %d nodes to the cache', count)
+
+    def stop(self, signum=None, frame=None):
+        self.running = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        self.write_cache()
+        # collect before forking, so the workers don't copy the pages the
+        # collector would free in each of them
+        gc.collect()
+        written = time.time()
+        try:
+            while self.running:
+                while len(self.pids) < self.workers:
+                    self.spawn()
+                if time.time() - written > self.refresh:
+                    self.write_cache()
+                    written = time.time()
+                self.reap()
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        for pid in self.pids:
+            os.kill(pid, signal.SIGTERM)
+        while self.pids:
+            self.reap(wait=True)
+
+    def reap(self, wait=False):
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, 0 if wait else os.WNOHANG)
+            except OSError, e:
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno == errno.ECHILD:
+                    self.pids.clear()
+                    return
+                raise
+            if not pid:
+                return
+            self.pids.discard(pid)
+            if self.running:
+                log.warning('worker %d exited with %d', pid, status)
+            if wait:
+                return
+
+
+def preload(store=None):
+    """Configure the application and return it with the node store"""
+    import main
+    from example_app import models
+    main.application.app
+    if store:
+        models.set_store(models.store_from_settings({'node_store': store}))
+    return main.application, models.get_store()
+
+
+def main(argv=sys.argv[1:]):
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--host', default='127.0.0.1')
+    parser.add_option('--port', type='int', default=8080)
+    parser.add_option('--workers', type='int',
+                      default=multiprocessing.cpu_count())
+    parser.add_option('--store',
+                      help='node store, overrides the node_store setting')
+    parser.add_option('--cache-file', default=os.path.join(
+        tempfile.gettempdir(), 'example_app_nodes.cache'))
+    parser.add_option('--cache-refresh', type='float', default=30.0,
+                      help='seconds between cache file writes')
+    parser.add_option('--cache-bytes', type='int', default=64 * 1024 * 1024)
+    parser.add_option('--no-cache', action='store_true')
+    options, args = parser.parse_args(argv)
+    logging.basicConfig()
+
+    application, store = preload(options.store)
+    from example_app import models
+    if isinstance(store, models.NdbStore):
+        parser.error('the datastore is not available outside of appengine, '
+                     'select another store with --store or node_store')
+
+    writer = None
+    if not options.no_cache and hasattr(store, 'iter_nodes'):
+        from example_app.nodecache import (
+            CachedStore,
+            NodeCache,
+            NodeCacheWriter,
+        )
+        writer = NodeCacheWriter(options.cache_file, options.cache_bytes)
+        models.set_store(CachedStore(store, NodeCache(options.cache_file)))
+
+    server = make_server(options.host, options.port, application)
+    log.warning('serving on http://%s:%d with %d workers', options.host,
+                options.port, options.workers)
+    Master(server, options.workers, store, writer,
+           options.cache_refresh).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,22 @@
-from .models import get_root
+from pyramid.authorization import ACLAuthorizationPolicy
+from .models import (
+    get_root,
+    set_store,
+    store_from_settings,
+)
+from .security import (
+    AdminContext,
+    AppengineAuthenticationPolicy,
+)
 
 def includeme(config):
+    if 'node_store' in config.registry.settings:
+        set_store(store_from_settings(config.registry.settings))
     config.set_root_factory(get_root)
+    config.set_authentication_policy(AppengineAuthenticationPolicy())
+    config.set_authorization_policy(ACLAuthorizationPolicy())
+    config.add_route('warmup', '/_ah/warmup')
+    config.add_route('memory_stats', '/_admin/memory', factory=AdminContext)
+    config.add_tween('example_app.memory.memory_tween_factory')
+    config.add_tween('example_app.requestlog.request_log_tween_factory')
     config.scan('.views')
@@ -0,0 +1,175 @@
+"""Generate synthetic trees for scale tests
+
+The nodes are written to the current node store in batches. The same
+arguments and seed always give the same tree::
+
+    >>> tree = generate_tree(1000, fanout='uniform:2:8', body='lognormal:7:1',
+    ...                      seed=42)
+
+Node names are unique on their own, ``tree.paths`` holds the traversal
+path of each node below the root. Distributions are given as specs:
+
+``fixed:N``
+    always N
+``uniform:A:B``
+    between A and B, both included
+``geometric:MEAN``
+    geometric distribution with the given mean, at least 0
+``lognormal:MU:SIGMA``
+    rounded log-normal distribution, i.e. for body sizes
+
+Each node has a popularity following Zipf's law, the rank of a node is
+random. ``tree.sample(count)`` draws paths by popularity, i.e. to replay
+them as requests. The store keeps the nodes only, ``tree.save(filename)``
+writes names, paths and popularity to a csv file for ``Tree.load``.
+"""
+from bisect import bisect
+from collections import deque
+import csv
+import math
+import random
+from . import models
+
+LOREM = (
+    'Lorem ipsum dolor sit amet, consectetur adipisicing elit, sed do '
+    'eiusmod tempor incididunt ut labore et dolore magna aliqua. Ut enim ad '
+    'minim veniam, quis nostrud exercitation ullamco laboris nisi ut aliquip '
+    'ex ea commodo consequat. Duis aute irure dolor in reprehenderit in '
+    'voluptate velit esse cillum dolore eu fugiat nulla pariatur. Excepteur '
+    'sint occaecat cupidatat non proident, sunt in culpa qui officia '
+    'deserunt mollit anim id est laborum. '
+)
+
+
+def distribution(spec):
+    """Return a function drawing a non-negative int from a random.Random
+    as given by `spec`.
+    """
+    if callable(spec):
+        return spec
+    kind, _, args = spec.partition(':')
+    try:
+        args = [float(arg) for arg in args.split(':')] if args else []
+        if kind == 'fixed':
+            value, = args
+            return lambda rng: int(value)
+        if kind == 'uniform':
+            low, high = args
+            return lambda rng: rng.randint(int(low), int(high))
+        if kind == 'geometric':
+            mean, = args
+            if mean <= 0:
+                return lambda rng: 0
+            lambd = math.log(1 + 1 / mean)
+            return lambda rng: int(rng.expovariate(lambd))
+        if kind == 'lognormal':
+            mu, sigma = args
+            return lambda rng: int(round(rng.lognormvariate(mu, sigma)))
+    except ValueError:
+        raise ValueError('invalid arguments in distribution %s' % spec)
+    raise ValueError('unknown distribution %s' % spec)
+
+
+def text(rng, size):
+    """Return `size` characters of filler text from a random offset"""
+    if size <= 0:
+        return u''
+    repeat = size // len(LOREM) + 2
+    start = rng.randrange(len(LOREM))
+    return unicode((LOREM * repeat)[start:start + size])
+
+
+class Tree(object):
+    """Paths and popularity of the generated nodes"""
+
+    def __init__(self, names, paths, popularity, seed=None):
+        self.names = names
+        self.paths = paths
+        self.popularity = popularity
+        self.rng = random.Random(seed)
+        self._cumulative = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def save(self, filename):
+        """Write the names, paths and popularity as csv"""
+        f = open(filename, 'wb')
+        try:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'path', 'popularity'])
+            for row in zip(self.names, self.paths, self.popularity):
+                writer.writerow(row[:2] + (repr(row[2]),))
+        finally:
+            f.close()
+
+    @classmethod
+    def load(cls, filename, seed=None):
+        """Read a tree written by ``save``"""
+        names, paths, popularity = [], [], []
+        f = open(filename, 'rb')
+        try:
+            for row in csv.DictReader(f):
+                names.append(row['name'])
+                paths.append(row['path'])
+                popularity.append(float(row['popularity']))
+        finally:
+            f.close()
+        return cls(names, paths, popularity, seed=seed)
+
+    def sample(self, count):
+        """Draw `count` paths, each with the probability of its popularity"""
+        if self._cumulative is None:
+            self._cumulative = []
+            total = 0.0
+            for weight in self.popularity:
+                total += weight
+                self._cumulative.append(total)
+        total = self._cumulative[-1]
+        rng, cumulative, paths = self.rng, self._cumulative, self.paths
+        return [paths[bisect(cumulative, rng.random() * total)]
+                for i in xrange(count)]
+
+
+def generate_tree(count, fanout='geometric:5', depth=8, body='lognormal:6:1',
+                  zipf=1.0, batch_size=500, seed=None, store=None):
+    """Write the root and `count` nodes below it to `store`, the current
+    node store by default, and return the Tree.
+
+    `fanout` gives the number of children per node and `body` the body size
+    in characters, `depth` limits the depth. Nodes are created breadth
+    first, once the queue runs dry the root gets more children.
+    """
+    rng = random.Random(seed)
+    fanout = distribution(fanout)
+    body = distribution(body)
+    if store is None:
+        store = models.get_store()
+    names = []
+    paths = []
+    batch = [('ROOT', u'Root', u'Initial Root Node')]
+    queue = deque()
+    while len(names) < count:
+        if not queue:
+            queue.append(('', 0))
+        parent, level = queue.popleft()
+        children = fanout(rng)
+        if not children and not parent:
+            children = 1
+        for i in xrange(min(children, count - len(names))):
+            name = 'n%d' % len(names)
+            path = '%s/%s' % (parent, name)
+            names.append(name)
+            paths.append(path)
+            batch.append((name, u'Node %s' % name, text(rng, body(rng))))
+            if level + 1 < depth:
+                queue.append((path, level + 1))
+            if len(batch) >= batch_size:
+                store.put_multi(batch)
+                batch = []
+    if batch:
+        store.put_multi(batch)
+    ranks = range(1, len(names) + 1)
+    rng.shuffle(ranks)
+    popularity = [1.0 / rank ** zipf for rank in ranks]
+    return Tree(names, paths, popularity, seed=seed)
@@ -0,0 +1,166 @@
+"""Memory and allocation statistics of sampled requests
+
+The tween records for a share of the requests, set by the
+``memory_stats.sample_rate`` setting, the change of the process' resident
+memory, the number of garbage collections and, with ``memory_stats.by_type``,
+the change of the live object count per type. The statistics are kept per
+route or view of the process and listed on ``/_admin/memory`` for admins.
+
+Counting objects by type walks all objects tracked by the collector, twice
+per sampled request, so keep the sample rate low in production. Requests
+running concurrently add to each other's numbers.
+"""
+from collections import defaultdict
+import gc
+import os
+import random
+import threading
+import weakref
+
+try:
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    PAGE_SIZE = 4096
+
+# number of types kept per key, the ones with the largest growth
+TOP_TYPES = 20
+
+
+def rss():
+    """Resident memory of the process in bytes, 0 if unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (IOError, ValueError, IndexError):
+        pass
+    try:
+        from google.appengine.api.runtime import runtime
+        return int(runtime.memory_usage().current() * 1024 * 1024)
+    except Exception:
+        return 0
+
+
+class _Sentinel(object):
+    pass
+
+
+class CollectionCounter(object):
+    """Count the runs of the garbage collector
+
+    There is no hook for them, so a cycle of garbage is kept around and
+    counted when a collection frees it.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._arm()
+
+    def _arm(self):
+        sentinel = _Sentinel()
+        sentinel.cycle = sentinel
+        self._ref = weakref.ref(sentinel, self._collected)
+
+    def _collected(self, ref):
+        self.count += 1
+        self._arm()
+
+
+def count_types():
+    counts = defaultdict(int)
+    for obj in gc.get_objects():
+        counts[type(obj).__name__] += 1
+    return counts
+
+
+class KeyStats(object):
+    """Statistics of the sampled requests of a route or view"""
+
+    def __init__(self):
+        self.samples = 0
+        self.rss = 0
+        self.max_rss = 0
+        self.collections = 0
+        self.types = defaultdict(int)
+
+    def add(self, rss, collections, types):
+        self.samples += 1
+        self.rss += rss
+        self.max_rss = max(self.max_rss, rss)
+        self.collections += collections
+        for name, delta in types.iteritems():
+            self.types[name] += delta
+        if len(self.types) > TOP_TYPES * 2:
+            top = sorted(self.types.iteritems(), key=lambda item: -item[1])
+            self.types = defaultdict(int, top[:TOP_TYPES])
+
+    def top_types(self):
+        top = sorted(self.types.iteritems(), key=lambda item: -item[1])
+        return [(name, delta) for name, delta in top[:TOP_TYPES] if delta]
+
+
+class MemoryStats(object):
+    """KeyStats of this process by route or view"""
+
+    def __init__(self):
+        self.keys = {}
+        self.lock = threading.Lock()
+
+    def add(self, key, rss, collections, types):
+        with self.lock:
+            if key not in self.keys:
+                self.keys[key] = KeyStats()
+            self.keys[key].add(rss, collections, types)
+
+    def items(self):
+        with self.lock:
+            return sorted(self.keys.items(), key=lambda item: -item[1].rss)
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+
+
+stats = MemoryStats()
+collection_counter = CollectionCounter()
+
+
+def request_key(request):
+    """Route name or the context class and view name of `request`"""
+    route = getattr(request, 'matched_route', None)
+    if route is not None:
+        return 'route %s' % route.name
+    context = getattr(request, 'context', None)
+    if context is None:
+        return 'no view'
+    return 'view %s/%s' % (type(context).__name__, request.view_name)
+
+
+def memory_tween_factory(handler, registry):
+    settings = registry.settings or {}
+    rate = float(settings.get('memory_stats.sample_rate', 0))
+    if rate <= 0:
+        return handler
+    by_type = bool(settings.get('memory_stats.by_type', False))
+
+    def memory_tween(request):
+        if random.random() >= rate:
+            return handler(request)
+        types_before = by_type and count_types() or {}
+        collections_before = collection_counter.count
+        rss_before = rss()
+        try:
+            return handler(request)
+        finally:
+            rss_delta = rss() - rss_before
+            collections_delta = collection_counter.count - collections_before
+            types = {}
+            if by_type:
+                types_after = count_types()
+                for name in set(types_before) | set(types_after):
+                    delta = types_after.get(name, 0) - \
+                        types_before.get(name, 0)
+                    if delta:
+                        types[name] = delta
+            stats.add(request_key(request), rss_delta, collections_delta,
+                      types)
+    return memory_tween
@@ -1,7 +1,34 @@
 from google.appengine.ext import ndb
-import logging
+from zope.interface import (
+    Attribute,
+    Interface,
+    classImplements,
+    implementer,
+)
+from .requestlog import getLogger
+from .stores import (
+    MemoryStore,
+    Node,
+    SqliteStore,
+)
 
+log = getLogger(__name__)
 
+
+class INode(Interface):
+    """A node of the tree, traversable to its children"""
+
+    title = Attribute('title')
+    body = Attribute('body')
+
+    def __getitem__(name):
+        """Return the node with name or raise KeyError"""
+
+
+classImplements(Node, INode)
+
+
+@implementer(INode)
 class TreeModel(ndb.Model):
     title = ndb.StringProperty()
     body = ndb.TextProperty()
@@ -10,29 +37,87 @@ class TreeModel(ndb.Model):
         return read_node(name)
 
 
-def create_node(name, title, body):
-    try:
-        read_node(name)
-    except KeyError, e:
+class NdbStore(object):
+    """Nodes in the appengine datastore"""
+
+    def get(self, name):
+        return ndb.Key(TreeModel, name).get()
+
+    def get_multi(self, names):
+        return ndb.get_multi([ndb.Key(TreeModel, name) for name in names])
+
+    def add(self, name, title, body):
+        if self.get(name) is not None:
+            return None
         node = TreeModel(id=name, title=title, body=body)
         node.put()
         return node
-    raise ValueError('node with name %s already exists' % name)
+
+    def put_multi(self, items):
+        ndb.put_multi([TreeModel(id=name, title=title, body=body)
+                       for name, title, body in items])
+
+
+# factories by the prefix of the node_store setting
+STORES = {
+    'memory': MemoryStore,
+    'ndb': NdbStore,
+    'sqlite': SqliteStore,
+}
+
+_store = NdbStore()
+
+
+def set_store(store):
+    global _store
+    _store = store
+
+
+def get_store():
+    return _store
+
+
+def store_from_settings(settings):
+    """Create the store configured as ``node_store``, i.e. ``ndb`` or
+    ``sqlite:/path/to/nodes.db``.
+    """
+    kind, _, arg = settings.get('node_store', 'ndb').partition(':')
+    if kind not in STORES:
+        raise ValueError('unknown node store %s' % kind)
+    if arg:
+        return STORES[kind](arg)
+    return STORES[kind]()
+
+
+def create_node(name, title, body):
+    node = _store.add(name, title, body)
+    if node is None:
+        raise ValueError('node with name %s already exists' % name)
+    return node
 
 
 def read_node(name):
-    node = ndb.Key(TreeModel, name).get()
+    node = _store.get(name)
     if not node:
         raise KeyError('node with name %s does not exists' % name)
     return node
 
 
+def preload_nodes(names):
+    """Load the named nodes in one batch
+
+    With the ndb store this fills memcache, which is shared by all instances.
+    Nothing is kept in the instance, ndb's context cache ends with the
+    request.
+    """
+    return [node for node in _store.get_multi(names) if node is not None]
+
+
 def get_root(request):
     try:
         root = read_node('ROOT')
-        logging.info('root found: %s' % root)
+        log.debug('root found', node=root)
     except KeyError:
         root = create_node('ROOT', 'Root', 'Initial Root Node')
-        logging.info('root created: %s' % root)
+        log.info('root created', node=root)
     return root
-
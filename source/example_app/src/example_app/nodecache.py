@@ -0,0 +1,186 @@
+"""Node cache file shared by the processes of a prefork server
+
+One process writes the nodes to the file, all workers map it read-only, so
+the cached nodes are in memory once per host instead of once per worker.
+The file is replaced atomically on each write and readers remap it when
+it changed. Nodes are not changed once created, bulk loads with
+``put_multi`` aside, so a cache miss falling back to the store is the only
+effect of a stale file.
+
+The file starts with a header (magic, generation, count), followed by
+``count`` index entries (name hash, offset, length) sorted by hash and the
+records (lengths of name, title and body followed by their utf-8 bytes).
+"""
+import fcntl
+from hashlib import md5
+import mmap
+import os
+import struct
+import tempfile
+import time
+from .stores import Node
+
+MAGIC = 'NODECACH'
+HEADER = struct.Struct('<8sQI')
+ENTRY = struct.Struct('<QQI')
+RECORD = struct.Struct('<III')
+
+
+def name_hash(name):
+    if isinstance(name, unicode):
+        name = name.encode('utf-8')
+    return struct.unpack('<Q', md5(name).digest()[:8])[0]
+
+
+def _utf8(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+class NodeCacheWriter(object):
+    """Write nodes to the cache file, holding an exclusive lock on
+    ``path + '.lock'`` to ensure a single writer.
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self._lock = open(self.path + '.lock', 'a')
+        fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def write(self, nodes):
+        """Write `nodes` until max_bytes is reached, return their count"""
+        records = []
+        size = 0
+        for node in nodes:
+            name, title, body = [_utf8(value) for value in
+                                 (node.name, node.title, node.body)]
+            record = RECORD.pack(len(name), len(title), len(body)) + \
+                name + title + body
+            size += len(record) + ENTRY.size
+            if size > self.max_bytes:
+                break
+            records.append((name_hash(name), record))
+        records.sort()
+        self.generation += 1
+        offset = HEADER.size + ENTRY.size * len(records)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, self.generation, len(records)))
+            for key, record in records:
+                f.write(ENTRY.pack(key, offset, len(record)))
+                offset += len(record)
+            for key, record in records:
+                f.write(record)
+        os.rename(tmp, self.path)
+        return len(records)
+
+    def close(self):
+        self._lock.close()
+
+
+class NodeCache(object):
+    """Read nodes from the cache file, remapping it at most every
+    `check_interval` seconds when it was replaced.
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = os.path.abspath(path)
+        self.check_interval = check_interval
+        self._map = None
+        self._stat = None
+        self._count = 0
+        self._checked = 0
+
+    def _refresh(self):
+        now = time.time()
+        if now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self._map, self._stat, self._count = None, None, 0
+            return
+        stat = (stat.st_ino, stat.st_mtime, stat.st_size)
+        if stat == self._stat:
+            return
+        with open(self.path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, generation, count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError('%s is no node cache file' % self.path)
+        self._map, self._stat, self._count = data, stat, count
+
+    def _lookup(self, data, count, key):
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if ENTRY.unpack_from(data, HEADER.size +
+                                 middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def get(self, name):
+        self._refresh()
+        data, count = self._map, self._count
+        if data is None:
+            return None
+        key = name_hash(name)
+        encoded = _utf8(name)
+        index = self._lookup(data, count, key)
+        while index < count:
+            entry_key, offset, length = ENTRY.unpack_from(
+                data, HEADER.size + index * ENTRY.size)
+            if entry_key != key:
+                break
+            name_len, title_len, body_len = RECORD.unpack_from(data, offset)
+            start = offset + RECORD.size
+            if data[start:start + name_len] == encoded:
+                start += name_len
+                title = data[start:start + title_len].decode('utf-8')
+                start += title_len
+                body = data[start:start + body_len].decode('utf-8')
+                return Node(name, title, body)
+            index += 1
+        return None
+
+    def __len__(self):
+        self._refresh()
+        return self._count
+
+
+class CachedStore(object):
+    """Look nodes up in a NodeCache before asking the wrapped store"""
+
+    def __init__(self, store, cache):
+        self.store = store
+        self.cache = cache
+
+    def get(self, name):
+        node = self.cache.get(name)
+        if node is None:
+            node = self.store.get(name)
+        return node
+
+    def get_multi(self, names):
+        names = list(names)
+        nodes = [self.cache.get(name) for name in names]
+        missing = [name for name, node in zip(names, nodes) if node is None]
+        if missing:
+            found = iter(self.store.get_multi(missing))
+            nodes = [node if node is not None else found.next()
+                     for node in nodes]
+        return nodes
+
+    def add(self, name, title, body):
+        if self.cache.get(name) is not None:
+            return None
+        return self.store.add(name, title, body)
+
+    def put_multi(self, items):
+        self.store.put_multi(items)
@@ -0,0 +1,185 @@
+"""Request scoped, structured and sampled logging
+
+Loggers from ``getLogger`` take a message and keyword fields::
+
+    log = getLogger(__name__)
+    log.debug('root found', node=root)
+
+During a request the tween buffers the records and emits them as one line
+on the ``example_app.request`` logger when the request is done, at the
+highest level of the records. Messages and fields are formatted then only,
+records below a logger's level are dropped right away. Outside of requests
+records go to the standard logger of the same name.
+
+Settings::
+
+    request_log.sampling:
+      example_app.models: 0.1
+    request_log.sample_below: WARNING
+    request_log.levels:
+      example_app: INFO
+
+``request_log.sampling`` keeps the given share of the records of a logger
+and its children. Only records below ``request_log.sample_below``, a level
+name or number, WARNING by default, are sampled, warnings and errors are always kept.
+``request_log.levels`` sets logger levels.
+"""
+import logging
+import random
+import threading
+import time
+import traceback
+
+_local = threading.local()
+
+# sampling rates by logger name, and their version to invalidate the rates
+# cached by the loggers
+_sampling = {}
+_version = [0]
+# records at this level and above are not sampled
+_sample_below = [logging.WARNING]
+
+OUTPUT = logging.getLogger('example_app.request')
+
+
+def configure(settings):
+    """Apply the request_log settings"""
+    _sampling.clear()
+    for name, rate in (settings.get('request_log.sampling') or {}).items():
+        _sampling[name] = float(rate)
+    _version[0] += 1
+    _sample_below[0] = level_number(
+        settings.get('request_log.sample_below') or 'WARNING')
+    for name, level in (settings.get('request_log.levels') or {}).items():
+        logging.getLogger(name).setLevel(level)
+
+
+def level_number(level):
+    """The number of `level`, given as number or name"""
+    if isinstance(level, int):
+        return int(level)
+    number = logging.getLevelName(level.upper())
+    if not isinstance(number, int):
+        raise ValueError('Unknown level: %r' % (level,))
+    return number
+
+
+def sampling_rate(name):
+    """Rate of the logger `name` or its closest configured parent"""
+    while name:
+        if name in _sampling:
+            return _sampling[name]
+        name = name.rpartition('.')[0]
+    return _sampling.get('', 1.0)
+
+
+def format_message(msg, args, fields, exc_text=None):
+    if args:
+        msg = msg % args
+    parts = [msg]
+    parts.extend('%s=%r' % item for item in sorted(fields.items()))
+    line = ' '.join(parts)
+    if exc_text:
+        line += '\n' + exc_text
+    return line
+
+
+def format_record(name, level, msg, args, fields, exc_text=None):
+    return '%s %s %s' % (name, logging.getLevelName(level),
+                         format_message(msg, args, fields, exc_text))
+
+
+class _Lazy(object):
+    """Format on str(), which logging calls for handled records only"""
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return self.func(*self.args)
+
+
+def format_request(method, path, status, elapsed, records):
+    line = '%s %s %s %.1fms' % (method, path, status, elapsed * 1000)
+    return ' | '.join([line] + [format_record(*record) for record in records])
+
+
+class RequestLogger(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.logger = logging.getLogger(name)
+        self._rate = None
+        self._version = None
+
+    @property
+    def rate(self):
+        if self._version != _version[0]:
+            self._rate = sampling_rate(self.name)
+            self._version = _version[0]
+        return self._rate
+
+    def log(self, level, msg, *args, **fields):
+        if not self.logger.isEnabledFor(level):
+            return
+        if level < _sample_below[0]:
+            rate = self.rate
+            if rate < 1.0 and random.random() >= rate:
+                return
+        exc_text = None
+        if fields.pop('exc_info', False):
+            exc_text = traceback.format_exc().rstrip()
+        buffer = getattr(_local, 'buffer', None)
+        if buffer is None:
+            self.logger.log(level, '%s', _Lazy(format_message, msg, args,
+                                               fields, exc_text))
+        else:
+            buffer.append((self.name, level, msg, args, fields, exc_text))
+
+    def debug(self, msg, *args, **fields):
+        self.log(logging.DEBUG, msg, *args, **fields)
+
+    def info(self, msg, *args, **fields):
+        self.log(logging.INFO, msg, *args, **fields)
+
+    def warning(self, msg, *args, **fields):
+        self.log(logging.WARNING, msg, *args, **fields)
+
+    def error(self, msg, *args, **fields):
+        self.log(logging.ERROR, msg, *args, **fields)
+
+    def exception(self, msg, *args, **fields):
+        fields['exc_info'] = True
+        self.log(logging.ERROR, msg, *args, **fields)
+
+
+_loggers = {}
+
+
+def getLogger(name):
+    if name not in _loggers:
+        _loggers[name] = RequestLogger(name)
+    return _loggers[name]
+
+
+def request_log_tween_factory(handler, registry):
+    configure(registry.settings or {})
+
+    def request_log_tween(request):
+        buffer = _local.buffer = []
+        start = time.time()
+        status = 500
+        try:
+            response = handler(request)
+            status = response.status_int
+            return response
+        finally:
+            _local.buffer = None
+            if buffer:
+                level = max(record[1] for record in buffer)
+                if OUTPUT.isEnabledFor(level):
+                    OUTPUT.log(level, '%s', _Lazy(
+                        format_request, request.method, request.path_qs,
+                        status, time.time() - start, buffer))
+    return request_log_tween
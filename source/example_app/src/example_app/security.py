@@ -0,0 +1,62 @@
+"""Principals of the users logged in through appengine
+
+App Engine guards ``/_admin/`` urls with ``login: admin`` in app.yaml, other
+servers of the app, i.e. prefork, don't. Views requiring the ``admin``
+permission are only allowed for appengine admins::
+
+    config.add_route('name', '/_admin/name', factory=AdminContext)
+    @view_config(route_name='name', permission='admin')
+"""
+from google.appengine.api import users
+from pyramid.interfaces import IAuthenticationPolicy
+from pyramid.security import (
+    Allow,
+    Authenticated,
+    DENY_ALL,
+    Everyone,
+)
+from zope.interface import implementer
+
+ADMIN = 'group:admin'
+
+
+@implementer(IAuthenticationPolicy)
+class AppengineAuthenticationPolicy(object):
+    """The user and admin flag of the appengine users api
+
+    Logging in and out happens on the urls of the users api, so remember and
+    forget have nothing to do.
+    """
+
+    def authenticated_userid(self, request):
+        user = users.get_current_user()
+        return user and user.email() or None
+
+    unauthenticated_userid = authenticated_userid
+
+    def effective_principals(self, request):
+        principals = [Everyone]
+        userid = self.authenticated_userid(request)
+        if userid is not None:
+            principals.extend([Authenticated, userid])
+            if users.is_current_user_admin():
+                principals.append(ADMIN)
+        return principals
+
+    def remember(self, request, principal, **kw):
+        return []
+
+    def forget(self, request):
+        return []
+
+
+class AdminContext(object):
+    """Context of the ``/_admin/`` routes"""
+
+    __acl__ = [
+        (Allow, ADMIN, 'admin'),
+        DENY_ALL,
+    ]
+
+    def __init__(self, request):
+        self.request = request
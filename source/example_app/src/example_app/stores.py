@@ -0,0 +1,165 @@
+"""Node stores not depending on the appengine datastore
+
+A node store provides ``get(name)`` and ``get_multi(names)``, returning
+``None`` for missing nodes, and ``add(name, title, body)``, returning the
+new node or ``None`` if the name is taken. ``put_multi(items)`` writes
+``(name, title, body)`` items in one batch, replacing existing nodes. The
+stores here also iterate all nodes with ``iter_nodes()``.
+``models.NdbStore`` is the datastore implementation.
+"""
+import os
+import threading
+
+
+class Node(object):
+    """Node as returned by the stores in this module"""
+
+    def __init__(self, name, title, body):
+        self.name = name
+        self.title = title
+        self.body = body
+
+    def __getitem__(self, name):
+        from .models import read_node
+        return read_node(name)
+
+    def __eq__(self, other):
+        return isinstance(other, Node) and \
+            (self.name, self.title, self.body) == \
+            (other.name, other.title, other.body)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'Node(name=%r, body=%r, title=%r)' % (self.name, self.body,
+                                                     self.title)
+
+
+class SqliteStore(object):
+    """Nodes in a SQLite database
+
+    The database runs in WAL mode, so readers in other processes don't block
+    on a writer. Each thread and process opens its own connection, which
+    makes a store created before forking usable in the children.
+    """
+
+    # keep below SQLITE_MAX_VARIABLE_NUMBER
+    batch_size = 500
+
+    def __init__(self, path, timeout=30.0):
+        self.path = os.path.abspath(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        self.connection()
+
+    def connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            import sqlite3
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS nodes '
+                               '(name TEXT PRIMARY KEY, title TEXT, body TEXT)')
+            connection.commit()
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def get(self, name):
+        row = self.connection().execute(
+            'SELECT name, title, body FROM nodes WHERE name = ?',
+            (name,)).fetchone()
+        if row is None:
+            return None
+        return Node(*row)
+
+    def get_multi(self, names):
+        names = list(names)
+        found = {}
+        connection = self.connection()
+        for start in range(0, len(names), self.batch_size):
+            batch = names[start:start + self.batch_size]
+            rows = connection.execute(
+                'SELECT name, title, body FROM nodes WHERE name IN (%s)' %
+                ', '.join('?' * len(batch)), batch)
+            for name, title, body in rows:
+                found[name] = Node(name, title, body)
+        return [found.get(name) for name in names]
+
+    def add(self, name, title, body):
+        import sqlite3
+        title, body = unicode(title), unicode(body)
+        connection = self.connection()
+        try:
+            with connection:
+                connection.execute(
+                    'INSERT INTO nodes (name, title, body) VALUES (?, ?, ?)',
+                    (name, title, body))
+        except sqlite3.IntegrityError:
+            return None
+        return Node(name, title, body)
+
+    def put_multi(self, items):
+        connection = self.connection()
+        with connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO nodes (name, title, body) '
+                'VALUES (?, ?, ?)',
+                ((name, unicode(title), unicode(body))
+                 for name, title, body in items))
+
+    def iter_nodes(self):
+        rows = self.connection().execute('SELECT name, title, body FROM nodes')
+        for name, title, body in rows:
+            yield Node(name, title, body)
+
+
+class MemoryStore(object):
+    """Nodes in a dict, for tests and benchmarks
+
+    ``snapshot()`` and ``restore(snapshot)`` save and reset the stored nodes
+    cheaply, the nodes themselves are shared and must not be modified.
+    """
+
+    def __init__(self):
+        self._nodes = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        return self._nodes.get(name)
+
+    def get_multi(self, names):
+        nodes = self._nodes
+        return [nodes.get(name) for name in names]
+
+    def add(self, name, title, body):
+        node = Node(name, unicode(title), unicode(body))
+        with self._lock:
+            if name in self._nodes:
+                return None
+            self._nodes[name] = node
+        return node
+
+    def put_multi(self, items):
+        nodes = dict((name, Node(name, unicode(title), unicode(body)))
+                     for name, title, body in items)
+        with self._lock:
+            self._nodes.update(nodes)
+
+    def iter_nodes(self):
+        return iter(self.snapshot().values())
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._nodes)
+
+    def restore(self, snapshot):
+        with self._lock:
+            self._nodes = dict(snapshot)
+
+    def clear(self):
+        self.restore({})
@@ -1,5 +1,7 @@
 from .layer import (
     APPENGINE_LAYER,
+    MEMORY_STORE_LAYER,
+    MEMORY_WEBTEST_LAYER,
+    ROOT_LAYER,
     WEBTEST_LAYER,
 )
-
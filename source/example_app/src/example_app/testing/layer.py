@@ -1,3 +1,7 @@
+from google.appengine.api import (
+    apiproxy_stub_map,
+    datastore,
+)
 from google.appengine.datastore import datastore_stub_util
 from google.appengine.tools.devappserver2.blob_upload \
     import Application as UploadApplication
@@ -9,38 +13,113 @@ from pyramid.interfaces import (
     ISession,
 )
 from pyramid import testing as pyramid_testing
+from pyramid.registry import Registry
 import sys
+import time
 import uuid
 from webtest import TestApp
 from zope.interface import implementer
 
 
+def init_datastore(testbed):
+    # Create a consistency policy that will simulate the High Replication
+    # consistency model.
+    policy = datastore_stub_util.PseudoRandomHRConsistencyPolicy(probability=1)
+    testbed.init_datastore_v3_stub(consistency_policy=policy)
+
+
+# stub initializers by service name
+STUBS = {
+    'app_identity_service': lambda testbed: testbed.init_app_identity_stub(),
+    'blobstore': lambda testbed: testbed.init_blobstore_stub(),
+    'datastore_v3': init_datastore,
+    'file': lambda testbed: testbed.init_files_stub(),
+    'images': lambda testbed: testbed.init_images_stub(),
+    'memcache': lambda testbed: testbed.init_memcache_stub(),
+    'urlfetch': lambda testbed: testbed.init_urlfetch_stub(),
+}
+
+
+class LazyStubMap(apiproxy_stub_map.APIProxyStubMap):
+    """Stub map initializing the declared stubs on their first call
+
+    It replaces the map of an activated testbed and starts with the stubs
+    of that map, which testbed copied from the original map.
+    """
+
+    def __init__(self, testbed):
+        apiproxy_stub_map.APIProxyStubMap.__init__(self)
+        self.testbed = testbed
+        self.declared = set()
+        # testbed.activate() copies the stubs registered outside of the
+        # tests into _test_stub_map, both are private to the SDK's
+        # APIProxyStubMap and Testbed
+        self._APIProxyStubMap__stub_map.update(
+            testbed._test_stub_map._APIProxyStubMap__stub_map)
+
+    def declare(self, *services):
+        self.declared.update(services)
+
+    def GetStub(self, service):
+        stub = apiproxy_stub_map.APIProxyStubMap.GetStub(self, service)
+        if stub is None and service in self.declared:
+            self.declared.discard(service)
+            STUBS[service](self.testbed)
+            stub = apiproxy_stub_map.APIProxyStubMap.GetStub(self, service)
+        return stub
+
+
 class AppengineLayer(Layer):
     """Base Appengine Layer
+
+    The services in ``stubs`` are declared for each test of this and the
+    derived layers, which may declare more through the ``stubmap`` resource.
+    A stub is initialized on the first call to its service only.
+
+    The datastore entities created by ``setUpFixtures`` are captured once
+    when the layer is set up and put into the datastore of each test.
     """
 
     defaultBases = ()
 
+    stubs = ('datastore_v3', 'memcache')
+
     def setUp(self):
         import gaefixes
         from google.appengine.ext import testbed
         self.testbed = testbed.Testbed()
+        self.fixtures = []
+        self.activate()
+        try:
+            self.setUpFixtures()
+            self.fixtures = [entity.ToPb() for entity in
+                             datastore.Query().Run()]
+            # don't serve the fixtures from ndb's cache after the tests
+            # changed them
+            from google.appengine.ext import ndb
+            ndb.get_context().clear_cache()
+        finally:
+            self.testbed.deactivate()
 
-    def testSetUp(self):
+    def setUpFixtures(self):
+        """Create the datastore entities every test starts with"""
+
+    def activate(self):
         self.testbed.activate()
         self.testbed.setup_env(overwrite=True, app_id='testing-server')
+        self.stubmap = LazyStubMap(self.testbed)
+        self.stubmap.declare(*self.stubs)
+        # testbed registers the stubs it initializes in its own map, the
+        # private _test_stub_map, which deactivate() discards again
+        self.testbed._test_stub_map = self.stubmap
+        apiproxy_stub_map.apiproxy = self.stubmap
 
-        # Create a consistency policy that will simulate the High Replication
-        # consistency model.
-        policy = datastore_stub_util.PseudoRandomHRConsistencyPolicy(
-                                                                 probability=1)
-        self.testbed.init_datastore_v3_stub(consistency_policy=policy)
-        self.testbed.init_blobstore_stub()
-        self.testbed.init_files_stub()
-        self.testbed.init_images_stub()
-        self.testbed.init_memcache_stub()
-        self.testbed.init_urlfetch_stub()
-        self.testbed.init_app_identity_stub()
+    def testSetUp(self):
+        self.activate()
+        self['stubmap'] = self.stubmap
+        if self.fixtures:
+            datastore.Put([datastore.Entity.FromPb(pb)
+                           for pb in self.fixtures])
 
         # make the global zca registry and the pyramid threadlocal registry the same.
         # The registry will still be empty since we do not load the
@@ -48,30 +127,104 @@ class AppengineLayer(Layer):
         pyramid_testing.setUp()
 
     def tearDown(self):
-        del self.testbed
+        del self.testbed, self.fixtures, self.stubmap
 
     def testTearDown(self):
+        del self['stubmap']
         self.testbed.deactivate()
 
 
 APPENGINE_LAYER = AppengineLayer()
 
 
+class RootLayer(AppengineLayer):
+    """Appengine Layer with an existing root node
+    """
+
+    def setUpFixtures(self):
+        from example_app.models import create_node
+        create_node('ROOT', 'Root', 'Initial Root Node')
+
+
+ROOT_LAYER = RootLayer()
+
+
+class MemoryStoreLayer(Layer):
+    """Keep the nodes in a MemoryStore instead of the datastore stub
+
+    Each test starts with the nodes of ``self.snapshot``, which is empty
+    unless a derived layer or benchmark fills the store and takes one.
+    """
+
+    defaultBases = ()
+
+    def setUp(self):
+        from example_app import models
+        self.previous_store = models.get_store()
+        self.store = models.MemoryStore()
+        self.snapshot = self.store.snapshot()
+        models.set_store(self.store)
+
+    def testSetUp(self):
+        self.store.restore(self.snapshot)
+
+    def tearDown(self):
+        from example_app import models
+        models.set_store(self.previous_store)
+        del self.store, self.snapshot, self.previous_store
+
+
+MEMORY_STORE_LAYER = MemoryStoreLayer()
+
+
+def overlay_registry(registry):
+    """Return an empty registry looking up components in `registry` too
+
+    Registrations on the overlay don't touch `registry`. The overlay shares
+    the settings and other attributes pyramid keeps on `registry`.
+    """
+    overlay = Registry(registry.__name__ + '-overlay', bases=(registry,))
+    for name, value in registry.__dict__.items():
+        if name not in overlay.__dict__:
+            setattr(overlay, name, value)
+    overlay.update(registry)
+    return overlay
+
+
 class WebtestLayer(Layer):
     """Base Appengine Layer
+
+    The application is configured once, each test gets an overlay of its
+    registry. With ``LAYER_TIMING`` set in the environment the layer reports
+    the per-test overhead and the time building the application took.
     """
 
     defaultBases = (APPENGINE_LAYER,)
 
-    def testSetUp(self):
+    # used by uploadtest
+    stubs = ('blobstore', 'file')
+
+    def setUp(self):
+        start = time.time()
         from main import app_config
         config = app_config()
-        application = config.make_wsgi_app()
-        upload_application = UploadApplication(application)
-        self.webtest = TestApp(application)
-        self.uploadtest = TestApp(upload_application)
-        self.app = self.webtest.app
-        self.registry = self.app.registry
+        self.app = config.make_wsgi_app()
+        self.app_registry = self.app.registry
+        self.webtest = TestApp(self.app)
+        self.build_time = time.time() - start
+        self.overhead = []
+
+    def testSetUp(self):
+        start = time.time()
+        try:
+            self['stubmap'].declare(*self.stubs)
+        except KeyError:
+            # not based on an AppengineLayer
+            pass
+        # the app is shared by the tests, don't pass on its cookies
+        self.webtest.reset()
+        self.registry = overlay_registry(self.app_registry)
+        self.app.registry = self.registry
         self.config = pyramid_testing.setUp(registry=self.registry)
 
         @implementer(ISessionFactory)
@@ -80,6 +233,7 @@ class WebtestLayer(Layer):
 
         self.registry.registerUtility(testing_session_factory,
                                       ISessionFactory)
+        self.overhead.append(time.time() - start)
 
     @property
     def session(self):
@@ -87,9 +241,37 @@ class WebtestLayer(Layer):
             self._session = pyramid_testing.DummySession()
         return self._session
 
+    @property
+    def uploadtest(self):
+        # the upload app takes the blobstore stub of the test when built
+        if not hasattr(self, '_uploadtest'):
+            self._uploadtest = TestApp(UploadApplication(self.app))
+        return self._uploadtest
+
     def testTearDown(self):
+        start = time.time()
         if hasattr(self, '_session'):
             del self._session
+        if hasattr(self, '_uploadtest'):
+            del self._uploadtest
         pyramid_testing.tearDown()
+        self.app.registry = self.app_registry
+        del self.registry, self.config
+        self.overhead[-1] += time.time() - start
+
+    def tearDown(self):
+        if os.environ.get('LAYER_TIMING') and self.overhead:
+            per_test = sum(self.overhead) / len(self.overhead)
+            sys.stderr.write(
+                '%s: %d tests, %.1f ms overhead per test, building the '
+                'application per test added %.1f ms\n' % (
+                    self.__name__, len(self.overhead), per_test * 1000,
+                    self.build_time * 1000))
+        del self.app, self.app_registry, self.webtest
+        del self.build_time, self.overhead
+
 
 WEBTEST_LAYER = WebtestLayer()
+
+MEMORY_WEBTEST_LAYER = WebtestLayer(bases=(MEMORY_STORE_LAYER,),
+                                    name='MemoryWebtestLayer')
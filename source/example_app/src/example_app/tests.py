@@ -1,10 +1,17 @@
 # -*- coding: utf-8 -*-
 import unittest
 import doctest
+import os
 from pprint import pprint
 from interlude import interact
-from plone.testing import layered
-from .testing import APPENGINE_LAYER, WEBTEST_LAYER
+from plone.testing import Layer
+from .testing import (
+    APPENGINE_LAYER,
+    MEMORY_STORE_LAYER,
+    MEMORY_WEBTEST_LAYER,
+    ROOT_LAYER,
+    WEBTEST_LAYER,
+)
 
 optionflags = doctest.NORMALIZE_WHITESPACE | \
               doctest.ELLIPSIS | \
@@ -14,16 +21,37 @@ optionflags = doctest.NORMALIZE_WHITESPACE | \
 TESTFILES = [
     ('models.rst', APPENGINE_LAYER),
     ('views.rst', WEBTEST_LAYER),
+    ('stores.rst', MEMORY_WEBTEST_LAYER),
+    ('fixtures.rst', ROOT_LAYER),
+    ('generate.rst', MEMORY_STORE_LAYER),
+    ('pkg_resources.rst', None),
 ]
 
+
+def file_layer(filename, layer):
+    """Layer of its own for the tests of `filename` based on `layer`
+
+    The testrunner runs each layer in a worker process of its own with
+    ``./bin/testpy -j N``, so the files run in parallel then.
+    """
+    name = '%s_%s' % (layer.__name__, os.path.splitext(filename)[0])
+    return Layer(bases=(layer,), name=name, module=__name__)
+
+
+def doctest_suite(filename, layer):
+    suite = doctest.DocFileSuite(
+        filename,
+        optionflags=optionflags,
+        globs={'interact': interact,
+               'layer': layer,
+               'pprint': pprint, },
+    )
+    if layer is not None:
+        suite.layer = file_layer(filename, layer)
+    return suite
+
+
 def test_suite():
     return unittest.TestSuite([
-        layered(doctest.DocFileSuite(
-            filename,
-            optionflags=optionflags,
-            globs={'interact': interact,
-                   'pprint': pprint, },
-        ), layer)  for filename, layer in TESTFILES
+        doctest_suite(filename, layer) for filename, layer in TESTFILES
     ])
-
-
@@ -1,5 +1,42 @@
+from pyramid.httpexceptions import HTTPFound
+from pyramid.renderers import render
 from pyramid.view import view_config
+from . import memory
+from .models import get_root, preload_nodes
 
-@view_config(context=".models.TreeModel", renderer='templates/node.pt')
+@view_config(context=".models.INode", renderer='templates/node.pt')
 def node_view(context, request):
     return {'title': context.title, 'body': context.body}
+
+
+@view_config(route_name='warmup', renderer='string')
+def warmup_view(request):
+    """GAE requests /_ah/warmup before routing traffic to a new instance
+
+    Import the lazily loaded modules and compile the node template in this
+    instance, so the first user request doesn't pay for them. The root and
+    the ``warmup.nodes`` are read to fill memcache, not cached per instance.
+    """
+    settings = request.registry.settings
+    for name in settings.get('warmup.modules', ()):
+        __import__(name)
+    get_root(request)
+    preload_nodes(settings.get('warmup.nodes', ()))
+    render('templates/node.pt', {'title': '', 'body': ''}, request=request)
+    return 'OK'
+
+
+@view_config(route_name='memory_stats', request_method='GET',
+             permission='admin', renderer='templates/memory.pt')
+def memory_stats_view(request):
+    """Memory statistics of the sampled requests of this instance"""
+    return {'title': 'Memory statistics', 'stats': memory.stats.items()}
+
+
+@view_config(route_name='memory_stats', request_method='POST',
+             permission='admin')
+def memory_stats_clear_view(request):
+    """Clear the memory statistics and show the empty page"""
+    if request.POST.get('clear'):
+        memory.stats.clear()
+    return HTTPFound(location=request.route_url('memory_stats'))
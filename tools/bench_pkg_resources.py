@@ -0,0 +1,367 @@
+"""Micro benchmarks for the bundled ``app/pkg_resources.py``.
+
+Run them with the interpreter generated by buildout::
+
+    ./bin/python-gae tools/bench_pkg_resources.py [benchmark ...]
+
+Without arguments all benchmarks are run.
+"""
+from ConfigParser import RawConfigParser
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(BASE_DIR, 'app')
+sys.path.insert(0, APP_DIR)
+
+import pkg_resources
+
+BENCHMARKS = []
+
+
+def benchmark(func):
+    BENCHMARKS.append(func)
+    return func
+
+
+def report(name, before, after):
+    print '%-30s %10.2f ms %10.2f ms %8.1fx' % (
+        name, before * 1000, after * 1000, before / after
+    )
+
+
+def patched(name, value, func):
+    """Call ``func`` with ``pkg_resources.<name>`` temporarily replaced."""
+    orig = getattr(pkg_resources, name)
+    setattr(pkg_resources, name, value)
+    try:
+        return func()
+    finally:
+        setattr(pkg_resources, name, orig)
+
+
+def app_lib_eggs():
+    """Return the eggs of the ``app_lib`` part in buildout.cfg"""
+    parser = RawConfigParser()
+    parser.read(os.path.join(BASE_DIR, 'buildout.cfg'))
+    return parser.get('app_lib', 'eggs').split()
+
+
+def legacy_resolve(working_set, requirements, env=None):
+    """``WorkingSet.resolve()`` as shipped with distribute 0.6.28"""
+    requirements = list(requirements)[::-1]
+    processed = {}
+    best = {}
+    to_activate = []
+    while requirements:
+        req = requirements.pop(0)
+        if pkg_resources._override_setuptools(req):
+            req = pkg_resources.Requirement._parse('distribute')
+        if req in processed:
+            continue
+        dist = best.get(req.key)
+        if dist is None:
+            dist = working_set.by_key.get(req.key)
+            if dist is None:
+                if env is None:
+                    env = pkg_resources.Environment(working_set.entries)
+                dist = best[req.key] = env.best_match(req, working_set)
+                if dist is None:
+                    raise pkg_resources.DistributionNotFound(req)
+            to_activate.append(dist)
+        if dist not in req:
+            raise pkg_resources.VersionConflict(dist, req)
+        requirements.extend(dist.requires(req.extras)[::-1])
+        processed[req] = True
+    return to_activate
+
+
+def make_dists(directory, count):
+    """Create `count` .egg-info directories with requirements and entry
+    points in `directory`"""
+    for i in range(count):
+        egg_info = os.path.join(directory, 'dist%d-1.%d.egg-info' % (i, i))
+        os.mkdir(egg_info)
+        metadata = {
+            'PKG-INFO': 'Metadata-Version: 1.0\nName: dist%d\n'
+                        'Version: 1.%d\n' % (i, i),
+            'requires.txt': 'dist%d>=1.0\n\n[test]\ndist%d\n' % (
+                (i + 1) % count, (i + 2) % count),
+            'entry_points.txt': '[console_scripts]\n'
+                                'dist%d = dist%d.main:run\n' % (i, i),
+            'top_level.txt': 'dist%d\n' % i,
+            'namespace_packages.txt': '',
+        }
+        for name, content in metadata.items():
+            f = open(os.path.join(egg_info, name), 'w')
+            f.write(content)
+            f.close()
+
+
+def version_pins():
+    """Return the ``(name, version)`` pins of versions.cfg"""
+    parser = RawConfigParser()
+    parser.optionxform = str
+    parser.read(os.path.join(BASE_DIR, 'versions.cfg'))
+    return parser.items('versions')
+
+
+@benchmark
+def parse_version(number=2000):
+    """Resolve the versions.cfg pin list, uncached vs. memoized"""
+    pins = version_pins()
+
+    def resolve_pins():
+        for name, version in pins:
+            req = pkg_resources.Requirement.parse('%s==%s' % (name, version))
+            assert version in req
+
+    before = min(timeit.repeat(
+        lambda: patched('parse_version', pkg_resources._parse_version,
+                        resolve_pins),
+        number=number, repeat=3,
+    ))
+    after = min(timeit.repeat(resolve_pins, number=number, repeat=3))
+    report('parse_version (%d pins)' % len(pins), before, after)
+
+
+@benchmark
+def resolve(number=200):
+    """Resolve the dependency closure of the ``app_lib`` eggs"""
+    eggs = app_lib_eggs()
+    working_set = pkg_resources.WorkingSet()
+    expected = legacy_resolve(working_set, pkg_resources.parse_requirements(eggs))
+    assert working_set.resolve(pkg_resources.parse_requirements(eggs)) == \
+        expected
+
+    before = min(timeit.repeat(
+        lambda: legacy_resolve(working_set,
+                               pkg_resources.parse_requirements(eggs)),
+        number=number, repeat=3,
+    ))
+    after = min(timeit.repeat(
+        lambda: working_set.resolve(pkg_resources.parse_requirements(eggs)),
+        number=number, repeat=3,
+    ))
+    report('resolve (%d dists)' % len(expected), before, after)
+
+
+@benchmark
+def scan(number=200):
+    """Build a WorkingSet of sys.path, cold vs. cached directory listings"""
+    def cold():
+        pkg_resources._path_item_cache.clear()
+        return pkg_resources.WorkingSet()
+
+    before = min(timeit.repeat(cold, number=number, repeat=3))
+    after = min(timeit.repeat(pkg_resources.WorkingSet, number=number,
+                              repeat=3))
+    report('scan (%d entries)' % len(sys.path), before, after)
+
+
+@benchmark
+def metadata(number=20, count=300):
+    """Dependency, entry point and metadata access, fresh vs. warm dists"""
+    directory = tempfile.mkdtemp()
+    try:
+        make_dists(directory, count)
+
+        def access(dists):
+            for dist in dists:
+                for extras in ((), ('test',), ()):
+                    dist.requires(extras)
+                dist.get_entry_map('console_scripts')
+                for name in ('top_level.txt', 'namespace_packages.txt'):
+                    list(dist._get_metadata(name))
+
+        warm = list(pkg_resources.find_distributions(directory))
+        access(warm)
+        before = min(timeit.repeat(
+            lambda: access(pkg_resources.find_distributions(directory)),
+            number=number, repeat=3,
+        ))
+        after = min(timeit.repeat(lambda: access(warm), number=number,
+                                  repeat=3))
+    finally:
+        shutil.rmtree(directory)
+    report('metadata (%d dists)' % count, before, after)
+
+
+@benchmark
+def provider(number=20000):
+    """Resolve a package resource, uncached vs. cached provider lookup"""
+    def lookup():
+        return pkg_resources.resource_exists('pkg_resources',
+                                             'pkg_resources.py')
+
+    def uncached():
+        pkg_resources._clear_adapter_caches()
+        return lookup()
+
+    before = min(timeit.repeat(uncached, number=number, repeat=3))
+    after = min(timeit.repeat(lookup, number=number, repeat=3))
+    report('provider', before, after)
+
+
+# entry point groups Pyramid and its paste integration look up on startup
+ENTRY_POINT_GROUPS = (
+    'paste.app_factory',
+    'paste.filter_app_factory',
+    'paste.server_runner',
+    'pyramid.scaffold',
+)
+
+
+@benchmark
+def entry_points(number=200):
+    """Load Pyramid's startup entry points, uncached vs. memoized"""
+    entry_points = []
+    for group in ENTRY_POINT_GROUPS:
+        for ep in pkg_resources.iter_entry_points(group):
+            try:
+                ep.load()
+            except (ImportError, pkg_resources.ResolutionError):
+                continue
+            entry_points.append(ep)
+    if not entry_points:
+        print 'entry_points: no loadable entry points found'
+        return
+
+    def load_all():
+        for ep in entry_points:
+            ep.load()
+
+    def uncached():
+        for ep in entry_points:
+            ep._loaded = None
+        load_all()
+
+    before = min(timeit.repeat(uncached, number=number, repeat=3))
+    after = min(timeit.repeat(load_all, number=number, repeat=3))
+    report('entry_points (%d)' % len(entry_points), before, after)
+
+
+@benchmark
+def threaded_scan(number=20, threads=4):
+    """Build a cold WorkingSet of sys.path, sequential vs. threaded"""
+    def build(scan_threads):
+        pkg_resources._path_item_cache.clear()
+        pkg_resources.SCAN_THREADS = scan_threads
+        try:
+            return pkg_resources.WorkingSet()
+        finally:
+            pkg_resources.SCAN_THREADS = 0
+
+    sequential, threaded = build(0), build(threads)
+    assert sequential.entries == threaded.entries
+    assert sequential.entry_keys == threaded.entry_keys
+    assert sequential.by_key == threaded.by_key
+
+    before = min(timeit.repeat(lambda: build(0), number=number, repeat=3))
+    after = min(timeit.repeat(lambda: build(threads), number=number,
+                              repeat=3))
+    report('threaded_scan (%d threads)' % threads, before, after)
+
+
+@benchmark
+def best_match(number=200, count=2000):
+    """Pick pinned versions from a large find-links style environment"""
+    env = pkg_resources.Environment([])
+    for i in range(count):
+        env.add(pkg_resources.Distribution(
+            location='/find-links/foo-%d.%d.tar.gz' % divmod(i, 100),
+            project_name='foo', version='%d.%d' % divmod(i, 100),
+        ))
+    working_set = pkg_resources.WorkingSet([])
+    reqs = [pkg_resources.Requirement.parse('foo==%d.%d' % divmod(i, 100))
+            for i in range(0, count, count / 10)]
+
+    def linear():
+        for req in reqs:
+            for dist in env[req.key]:
+                if dist in req:
+                    break
+
+    def indexed():
+        for req in reqs:
+            env.best_match(req, working_set)
+
+    before = min(timeit.repeat(linear, number=number, repeat=3))
+    after = min(timeit.repeat(indexed, number=number, repeat=3))
+    report('best_match (%d dists)' % count, before, after)
+
+
+REQUIRES_TXT = """\
+setuptools
+Chameleon >= 1.2.3
+Mako >= 0.3.6
+WebOb >= 1.2b3
+repoze.lru >= 0.4
+zope.interface >= 3.8.0
+zope.deprecation >= 3.5.0
+venusian >= 1.0a3
+translationstring >= 0.4
+PasteDeploy >= 1.5.0
+
+[testing]
+WebTest >= 1.3.1
+zope.component>=3.11.0
+nose
+coverage
+virtualenv
+"""
+
+ENTRY_POINTS_TXT = """\
+[pyramid.scaffold]
+starter=pyramid.scaffolds:StarterProjectTemplate
+zodb=pyramid.scaffolds:ZODBProjectTemplate
+alchemy=pyramid.scaffolds:AlchemyProjectTemplate
+
+[console_scripts]
+pcreate = pyramid.scripts.pcreate:main
+pserve = pyramid.scripts.pserve:main
+pshell = pyramid.scripts.pshell:main
+proutes = pyramid.scripts.proutes:main
+pviews = pyramid.scripts.pviews:main
+ptweens = pyramid.scripts.ptweens:main
+prequest = pyramid.scripts.prequest:main
+
+[paste.server_runner]
+wsgiref = pyramid.scripts.pserve:wsgiref_server_runner
+cherrypy = pyramid.scripts.pserve:cherrypy_server_runner
+"""
+
+
+@benchmark
+def text_parsing(number=2000):
+    """Parse pyramid's requires.txt and entry_points.txt, plain vs. memoized"""
+    def parse(split_sections, parse_requirements, parse_map):
+        def run():
+            for section, content in split_sections(REQUIRES_TXT):
+                list(parse_requirements(content))
+            parse_map(ENTRY_POINTS_TXT)
+        return run
+
+    before = min(timeit.repeat(parse(
+        pkg_resources._split_sections, pkg_resources._parse_requirements,
+        pkg_resources.EntryPoint._parse_map,
+    ), number=number, repeat=3))
+    after = min(timeit.repeat(parse(
+        pkg_resources.split_sections, pkg_resources.parse_requirements,
+        pkg_resources.EntryPoint.parse_map,
+    ), number=number, repeat=3))
+    report('text_parsing', before, after)
+
+
+def main(argv=sys.argv[1:]):
+    print '%-30s %13s %13s %9s' % ('benchmark', 'before', 'after', 'speedup')
+    for func in BENCHMARKS:
+        if not argv or func.__name__ in argv:
+            func()
+
+
+if __name__ == '__main__':
+    main()
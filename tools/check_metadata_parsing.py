@@ -0,0 +1,100 @@
+"""Check the memoized metadata parsers against the plain ones.
+
+Parses the ``requires.txt``, ``depends.txt``, ``entry_points.txt``,
+``namespace_packages.txt`` and ``top_level.txt`` files of every
+distribution in ``app/distlib`` (or the given directories) with the
+memoized, fast-path parsers of ``pkg_resources`` and with the plain
+parsers, and reports any difference::
+
+    ./bin/python-gae tools/check_metadata_parsing.py [directory ...]
+"""
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(BASE_DIR, 'app')
+sys.path.insert(0, APP_DIR)
+
+import pkg_resources
+
+METADATA_FILES = (
+    'requires.txt',
+    'depends.txt',
+    'entry_points.txt',
+    'namespace_packages.txt',
+    'top_level.txt',
+)
+
+
+def metadata_files(directories):
+    """Yield the paths of the metadata files found in `directories`"""
+    for directory in directories:
+        for root, dirs, files in os.walk(directory):
+            if not root.lower().endswith(('.egg-info', '.dist-info')):
+                continue
+            for name in METADATA_FILES:
+                if name in files:
+                    yield os.path.join(root, name)
+
+
+def outcome(func, *args):
+    """Return the result of ``func(*args)`` or the error it raised"""
+    try:
+        return func(*args)
+    except ValueError, e:
+        return 'ValueError: %s' % (e,)
+
+
+def parsed(text):
+    """Results of all parsers applicable to `text`, memoized and plain"""
+    def requirements(parse):
+        return lambda: [
+            (section, [str(req) for req in parse(content)])
+            for section, content in pkg_resources._split_sections(text)
+        ]
+
+    def entry_points(parse):
+        return lambda: sorted(
+            (group, sorted(str(ep) for ep in eps.values()))
+            for group, eps in parse(text).items()
+        )
+
+    return [
+        (name, outcome(memoized), outcome(plain))
+        for name, memoized, plain in [
+            ('split_sections',
+             lambda: list(pkg_resources.split_sections(text)),
+             lambda: list(pkg_resources._split_sections(text))),
+            ('parse_requirements',
+             requirements(pkg_resources.parse_requirements),
+             requirements(pkg_resources._parse_requirements)),
+            ('parse_map',
+             entry_points(pkg_resources.EntryPoint.parse_map),
+             entry_points(pkg_resources.EntryPoint._parse_map)),
+        ]
+    ]
+
+
+def main(argv=sys.argv[1:]):
+    directories = argv or [os.path.join(APP_DIR, 'distlib')]
+    checked = failed = 0
+    for path in metadata_files(directories):
+        f = open(path)
+        try:
+            text = f.read()
+        finally:
+            f.close()
+        # twice, to compare the memoized results as well
+        for i in range(2):
+            for name, memoized, plain in parsed(text):
+                checked += 1
+                if memoized != plain:
+                    failed += 1
+                    print '%s: %s differs\n  memoized: %r\n  plain:    %r' % (
+                        path, name, memoized, plain)
+    print 'checked %d parses, %d differences' % (checked, failed)
+    return failed and 1 or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Populate a node store with a synthetic tree for scale tests.
+
+Run it with the interpreter generated by buildout::
+
+    ./bin/python-gae tools/generate_tree.py --store sqlite:nodes.db \
+        --count 100000 --seed 1 --tree tree.csv --log requests.csv
+
+See ``example_app.generate`` for the distribution specs. ``--log`` writes
+requests drawn by popularity as csv with timestamp, method and path,
+``tools/replay.py`` replays them. ``--tree`` saves the paths and popularity
+of the nodes, the store doesn't keep them. Later logs for the same tree are
+drawn from that file without generating the nodes again::
+
+    ./bin/python-gae tools/generate_tree.py --load-tree tree.csv \
+        --seed 2 --log more-requests.csv
+"""
+import csv
+from optparse import OptionParser
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(BASE_DIR, 'app')
+sys.path.insert(0, APP_DIR)
+
+
+def write_log(tree, filename, count, rate=10.0):
+    """Write `count` requests drawn from `tree` at `rate` per second"""
+    f = open(filename, 'wb')
+    try:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'method', 'path'])
+        for i, path in enumerate(tree.sample(count)):
+            writer.writerow(['%.3f' % (i / rate), 'GET', path])
+    finally:
+        f.close()
+
+
+def main(argv=sys.argv[1:]):
+    parser = OptionParser(usage='%prog --store STORE [options]')
+    parser.add_option('--store', help='node store, i.e. sqlite:nodes.db')
+    parser.add_option('--count', type='int', default=1000)
+    parser.add_option('--fanout', default='geometric:5')
+    parser.add_option('--depth', type='int', default=8)
+    parser.add_option('--body', default='lognormal:6:1',
+                      help='body size distribution')
+    parser.add_option('--zipf', type='float', default=1.0,
+                      help='exponent of the popularity distribution')
+    parser.add_option('--batch-size', type='int', default=500)
+    parser.add_option('--seed', type='int', default=0)
+    parser.add_option('--tree',
+                      help='write paths and popularity to this file')
+    parser.add_option('--load-tree',
+                      help='sample the log from this file, generate nothing')
+    parser.add_option('--log', help='write sampled requests to this file')
+    parser.add_option('--log-count', type='int', default=10000)
+    options, args = parser.parse_args(argv)
+
+    from example_app.generate import Tree, generate_tree
+    if options.load_tree:
+        if not options.log:
+            parser.error('--load-tree requires --log')
+        tree = Tree.load(options.load_tree, seed=options.seed)
+        write_log(tree, options.log, options.log_count)
+        print 'wrote %d requests to %s' % (options.log_count, options.log)
+        return
+
+    if not options.store or options.store.startswith('ndb'):
+        parser.error('--store must select a store other than ndb')
+    from example_app.models import store_from_settings
+    store = store_from_settings({'node_store': options.store})
+    start = time.time()
+    tree = generate_tree(options.count, fanout=options.fanout,
+                         depth=options.depth, body=options.body,
+                         zipf=options.zipf, batch_size=options.batch_size,
+                         seed=options.seed, store=store)
+    print 'generated %d nodes in %.1fs, deepest path has %d nodes' % (
+        len(tree), time.time() - start,
+        max([path.count('/') for path in tree.paths] or [0]))
+    if options.tree:
+        tree.save(options.tree)
+        print 'wrote the paths and popularity to %s' % options.tree
+    if options.log:
+        write_log(tree, options.log, options.log_count)
+        print 'wrote %d requests to %s' % (options.log_count, options.log)
+
+
+if __name__ == '__main__':
+    main()
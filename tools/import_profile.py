@@ -0,0 +1,276 @@
+"""Profile the import time of the app on a cold start.
+
+Installs an import hook before ``main`` (and thus ``gaefixes``) is imported,
+records the cumulative and self time of every module loaded on the way
+together with the import tree, and writes a report sorted by the chosen
+column::
+
+    ./bin/python-gae tools/import_profile.py [--sort self] [--csv out.csv]
+
+``main`` configures the pyramid app on the first request only, so the
+report has a second phase building ``main.application.app``, and with
+``--path`` a third one sending a request for that path.  Each phase lists
+the modules it imported first and its total wall time.
+
+The datastore and memcache stubs of the SDK are activated before the hook
+is installed, so their own imports are not part of the profile.
+"""
+import __builtin__
+from optparse import OptionParser
+import csv
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(BASE_DIR, 'app')
+DISTLIB_DIR = os.path.join(APP_DIR, 'distlib')
+
+timer = time.time
+
+
+class Record(object):
+    """Modules loaded by one ``__import__`` call"""
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.modules = []
+        self.children = []
+        self.cumulative = 0.0
+        self.overhead = 0.0  # time spent by the profiler in nested calls
+
+    @property
+    def label(self):
+        return ', '.join(sorted(self.modules)) or self.name
+
+    @property
+    def self_time(self):
+        return self.cumulative - sum([c.cumulative for c in self.children])
+
+    @property
+    def depth(self):
+        depth, parent = 0, self.parent
+        while parent is not None:
+            depth, parent = depth + 1, parent.parent
+        return depth
+
+    @property
+    def origin(self):
+        """Where the first module was loaded from"""
+        for name in self.modules:
+            filename = getattr(sys.modules.get(name), '__file__', None)
+            if filename:
+                filename = os.path.abspath(filename)
+                if filename.startswith(DISTLIB_DIR):
+                    return 'distlib/' + os.path.relpath(
+                        filename, DISTLIB_DIR).split(os.sep)[0]
+                if filename.startswith(APP_DIR):
+                    return 'app'
+                if '/google/appengine/' in filename:
+                    return 'sdk'
+                return 'python'
+        return 'builtin'
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            for record in child.walk():
+                yield record
+
+
+class ImportProfiler(object):
+    """Time nested imports by wrapping ``__builtin__.__import__``"""
+
+    def __init__(self):
+        self.root = Record('<root>')
+        self.known = set(sys.modules)
+        self._count = len(sys.modules)
+        self._stack = [self.root]
+        self._import = None
+
+    def install(self):
+        self._import = __builtin__.__import__
+        __builtin__.__import__ = self.profiled_import
+
+    def uninstall(self):
+        __builtin__.__import__ = self._import
+
+    def profiled_import(self, name, globals=None, locals=None, fromlist=None,
+                        level=-1):
+        parent = self._stack[-1]
+        begin = timer()
+        # modules are put into sys.modules before their code runs, the ones
+        # showing up now are being loaded by the enclosing import
+        self.claim(parent)
+        record = Record(name, parent)
+        self._stack.append(record)
+        start = timer()
+        parent.overhead += start - begin
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = timer() - start
+            self._stack.pop()
+            begin = timer()
+            self.claim(record)
+            record.cumulative = elapsed - record.overhead
+            if record.modules:
+                parent.children.append(record)
+            else:
+                for child in record.children:
+                    child.parent = parent
+                parent.children.extend(record.children)
+            parent.overhead += record.overhead + timer() - begin
+
+    def claim(self, record):
+        """Add the modules new in ``sys.modules`` to `record`"""
+        if len(sys.modules) == self._count:
+            return
+        new = [name for name in sys.modules if name not in self.known]
+        self.known.update(new)
+        self._count = len(sys.modules)
+        # failed implicit relative imports leave None in sys.modules
+        record.modules.extend(
+            [name for name in new if sys.modules[name] is not None]
+        )
+
+    def records(self):
+        return [record for record in self.root.walk()
+                if record is not self.root]
+
+
+def activate_stubs():
+    """Activate the SDK stubs the app may touch while being imported"""
+    from google.appengine.ext import testbed
+    bed = testbed.Testbed()
+    bed.activate()
+    bed.setup_env(overwrite=True, app_id='import-profile')
+    bed.init_datastore_v3_stub()
+    bed.init_memcache_stub()
+    return bed
+
+
+SORT_KEYS = {
+    'cumulative': lambda r: -r.cumulative,
+    'self': lambda r: -r.self_time,
+    'name': lambda r: r.label,
+    'origin': lambda r: (r.origin, -r.self_time),
+}
+
+
+def profile(func):
+    """Call `func` and return the profiler of its imports and its wall time
+    """
+    profiler = ImportProfiler()
+    profiler.install()
+    start = timer()
+    try:
+        func()
+    finally:
+        elapsed = timer() - start
+        profiler.uninstall()
+    return profiler, elapsed
+
+
+def phases(module, path=None):
+    """The (name, function) of the startup phases to profile"""
+    result = [('import %s' % module, lambda: __import__(module))]
+    if module == 'main':
+        def build():
+            sys.modules['main'].application.app
+
+        def request():
+            from webob import Request
+            Request.blank(path).get_response(sys.modules['main'].application)
+
+        result.append(('build main.application.app', build))
+        if path:
+            result.append(('request %s' % path, request))
+    return result
+
+
+def write_report(profiler, out, sort='cumulative', limit=50, min_ms=1.0):
+    records = profiler.records()
+    total = sum([r.cumulative for r in profiler.root.children])
+    out.write('imported %d modules in %.1f ms\n\n' % (
+        sum([len(r.modules) for r in records]), total * 1000))
+
+    out.write('%10s %10s  %-16s %s\n' % ('cum ms', 'self ms', 'origin', 'module'))
+    for record in sorted(records, key=SORT_KEYS[sort])[:limit]:
+        out.write('%10.1f %10.1f  %-16s %s\n' % (
+            record.cumulative * 1000, record.self_time * 1000,
+            record.origin, record.label))
+
+    out.write('\nself time by origin\n')
+    origins = {}
+    for record in records:
+        origins[record.origin] = origins.get(record.origin, 0) + \
+            record.self_time
+    for origin, self_time in sorted(origins.items(), key=lambda i: -i[1]):
+        out.write('%10.1f  %s\n' % (self_time * 1000, origin))
+
+    out.write('\nimport tree (cumulative >= %.1f ms)\n' % min_ms)
+    for record in records:
+        if record.cumulative * 1000 >= min_ms:
+            out.write('%10.1f %10.1f  %s%s\n' % (
+                record.cumulative * 1000, record.self_time * 1000,
+                '  ' * (record.depth - 1), record.label))
+
+
+def write_csv(profiles, filename):
+    """Write the records of the (phase, profiler) pairs `profiles`"""
+    f = open(filename, 'wb')
+    try:
+        writer = csv.writer(f)
+        writer.writerow(['phase', 'module', 'origin', 'cumulative_ms',
+                         'self_ms', 'depth', 'parent'])
+        for phase, profiler in profiles:
+            for record in profiler.records():
+                parent = record.parent is not profiler.root and \
+                    record.parent.label or ''
+                writer.writerow([phase, record.label, record.origin,
+                                 '%.3f' % (record.cumulative * 1000),
+                                 '%.3f' % (record.self_time * 1000),
+                                 record.depth, parent])
+    finally:
+        f.close()
+
+
+def main(argv=sys.argv[1:]):
+    parser = OptionParser(usage='%prog [options] [module]')
+    parser.add_option('--sort', choices=sorted(SORT_KEYS),
+                      default='cumulative',
+                      help='sort the flat report by this column')
+    parser.add_option('--limit', type='int', default=50,
+                      help='number of modules in the flat report')
+    parser.add_option('--min-ms', type='float', default=1.0,
+                      help='hide faster imports in the tree')
+    parser.add_option('--csv', help='also write all records to this file')
+    parser.add_option('--no-stubs', action='store_true',
+                      help='do not activate the SDK stubs')
+    parser.add_option('--path',
+                      help='also profile a first request for this path')
+    options, args = parser.parse_args(argv)
+    module = args and args[0] or 'main'
+
+    os.chdir(APP_DIR)
+    sys.path.insert(0, APP_DIR)
+    os.environ.setdefault('SERVER_SOFTWARE', 'Development/import-profile')
+    if not options.no_stubs:
+        activate_stubs()
+
+    profiles = []
+    for phase, func in phases(module, options.path):
+        profiler, elapsed = profile(func)
+        profiles.append((phase, profiler))
+        sys.stdout.write('%s%s: %.1f ms\n' % (
+            len(profiles) > 1 and '\n\n' or '', phase, elapsed * 1000))
+        write_report(profiler, sys.stdout, options.sort, options.limit,
+                     options.min_ms)
+    if options.csv:
+        write_csv(profiles, options.csv)
+
+
+if __name__ == '__main__':
+    main()
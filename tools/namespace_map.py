@@ -0,0 +1,95 @@
+"""Write the namespace package map of the deployed distlib.
+
+``gaefixes`` registers ``app/namespace_packages.map`` with
+``pkg_resources.load_namespace_map()``, so ``declare_namespace()`` skips
+the scanned path items which don't contribute to a namespace package.
+The buildout ``namespace_map`` part runs this after ``app_lib``::
+
+    ./bin/python-gae tools/namespace_map.py [path_item ...]
+
+Path items are relative to the ``app`` directory. They default to the app
+directory, ``distlib`` and the library directories on the path of the
+interpreter, which are the SDK's for ``python-gae``.  Path items which are
+not scanned, i.e. the runtime's in production, are handled as usual.
+"""
+import os
+import sys
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(TOOLS_DIR)
+APP_DIR = os.path.join(BASE_DIR, 'app')
+MAP_FILE = os.path.join(APP_DIR, 'namespace_packages.map')
+
+
+def default_path_items(path=sys.path):
+    """The app directory, distlib and the directories on `path`"""
+    items = [os.curdir, 'distlib']
+    for item in path:
+        item = os.path.abspath(item or os.curdir)
+        if item == TOOLS_DIR or not os.path.isdir(item):
+            continue
+        relative = os.path.relpath(item, APP_DIR)
+        if not relative.startswith(os.pardir):
+            item = relative
+        if item not in items:
+            items.append(item)
+    return items
+
+
+def is_namespace(directory):
+    """True if `directory` is a package declaring a namespace"""
+    init = os.path.join(directory, '__init__.py')
+    if not os.path.isfile(init):
+        return False
+    f = open(init)
+    try:
+        return 'declare_namespace' in f.read()
+    finally:
+        f.close()
+
+
+def namespace_map(path_items, parent=None, mapping=None):
+    """Map namespace packages below `path_items` to contributing items"""
+    if mapping is None:
+        mapping = {}
+    found = {}
+    for item in path_items:
+        directory = os.path.join(APP_DIR, item)
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            if is_namespace(os.path.join(directory, name)):
+                found.setdefault(name, []).append(item)
+    for name, items in found.items():
+        package = parent and '%s.%s' % (parent, name) or name
+        mapping[package] = items
+        # nested namespace packages are looked up on the parent's __path__
+        namespace_map([os.path.join(item, name) for item in items],
+                      package, mapping)
+    return mapping
+
+
+def write_map(mapping, path_items, filename=MAP_FILE):
+    f = open(filename, 'w')
+    try:
+        f.write('# generated by tools/namespace_map.py, do not edit\n')
+        f.write('# scanned path items\n')
+        for item in path_items:
+            f.write('%s\n' % item)
+        for package in sorted(mapping):
+            f.write('[%s]\n' % package)
+            for item in mapping[package]:
+                f.write('%s\n' % item)
+    finally:
+        f.close()
+
+
+def main(argv=sys.argv[1:]):
+    path_items = argv or default_path_items()
+    mapping = namespace_map(path_items)
+    write_map(mapping, path_items)
+    print 'wrote %d namespace packages to %s' % (len(mapping), MAP_FILE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""Prune ``app/distlib`` to the files the app actually uses.
+
+``trace`` imports ``main``, runs a representative set of requests through
+``main.application`` and records every file below ``app/distlib`` that is
+imported, opened or listed on the way (modules, templates, locale and
+metadata files).  The result is written as an allowlist::
+
+    ./bin/python-gae tools/prune_distlib.py trace [--paths requests.txt]
+
+``apply`` removes all other files from ``app/distlib`` and reports the
+reduction in file count and size; use ``--dry-run`` to only see the
+report.  Run ``./bin/buildout`` to get the full distlib back::
+
+    ./bin/python-gae tools/prune_distlib.py apply [--dry-run]
+
+Code paths the requests don't exercise are pruned as well, so keep the
+request set representative and use ``--keep`` for modules imported on
+rare occasions only.  Distribution metadata (``*.egg-info``,
+``*.dist-info``) is always kept.  ``apply`` refuses allowlists with less
+than ``MIN_ALLOWLIST`` paths, as from a failed trace, unless ``--force``
+is given.
+"""
+import __builtin__
+from fnmatch import fnmatch
+from optparse import OptionParser
+import os
+import sys
+
+# real paths, as relative() compares them with resolved file names
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+APP_DIR = os.path.realpath(os.path.join(BASE_DIR, 'app'))
+DISTLIB_DIR = os.path.realpath(os.path.join(APP_DIR, 'distlib'))
+ALLOWLIST = os.path.join(BASE_DIR, 'distlib-allowlist.txt')
+
+# a trace of the app lists far more files, apply refuses shorter allowlists
+MIN_ALLOWLIST = 100
+
+DEFAULT_PATHS = [
+    '/_ah/warmup',
+    '/',
+    '/nonexistent',
+]
+
+
+def relative(path):
+    """Path relative to distlib or ``None`` if `path` is outside of it"""
+    path = os.path.realpath(os.path.abspath(path))
+    if not path.startswith(DISTLIB_DIR + os.sep):
+        return None
+    return os.path.relpath(path, DISTLIB_DIR)
+
+
+class FileTracer(object):
+    """Record the distlib files opened or listed while installed"""
+
+    def __init__(self):
+        self.paths = set()
+        self._open = self._listdir = None
+
+    def record(self, path):
+        if isinstance(path, basestring):
+            path = relative(path)
+            if path is not None:
+                self.paths.add(path)
+
+    def install(self):
+        self._open, self._listdir = __builtin__.open, os.listdir
+
+        def traced_open(name, *args, **kw):
+            self.record(name)
+            return self._open(name, *args, **kw)
+
+        def traced_listdir(path):
+            self.record(path)
+            return self._listdir(path)
+
+        __builtin__.open, os.listdir = traced_open, traced_listdir
+
+    def uninstall(self):
+        __builtin__.open, os.listdir = self._open, self._listdir
+
+    def record_modules(self):
+        """Record the source files of all imported modules"""
+        for module in sys.modules.values():
+            filename = getattr(module, '__file__', None)
+            if filename:
+                if filename.endswith(('.pyc', '.pyo')):
+                    filename = filename[:-1]
+                self.record(filename)
+
+
+def trace(paths):
+    """Run the requests for `paths` and return the used distlib paths"""
+    from webob import Request
+    from import_profile import activate_stubs
+
+    os.chdir(APP_DIR)
+    sys.path.insert(0, APP_DIR)
+    os.environ.setdefault('SERVER_SOFTWARE', 'Development/prune-distlib')
+    activate_stubs()
+
+    tracer = FileTracer()
+    tracer.install()
+    try:
+        import main
+        for path in paths:
+            response = Request.blank(path).get_response(main.application)
+            print '%s %s' % (response.status, path)
+    finally:
+        tracer.uninstall()
+    tracer.record_modules()
+    return tracer.paths
+
+
+def read_allowlist(filename=ALLOWLIST):
+    f = open(filename)
+    try:
+        return set([line.strip() for line in f
+                    if line.strip() and not line.startswith('#')])
+    finally:
+        f.close()
+
+
+def write_allowlist(paths, filename=ALLOWLIST):
+    f = open(filename, 'w')
+    try:
+        f.write('# distlib files used by the app, written by '
+                'tools/prune_distlib.py\n')
+        for path in sorted(paths):
+            f.write('%s\n' % path)
+    finally:
+        f.close()
+
+
+def is_metadata(path):
+    for part in path.split(os.sep):
+        if part.lower().endswith(('.egg-info', '.dist-info')):
+            return True
+    return False
+
+
+def prune(allowed, keep=(), dry_run=False):
+    """Remove the files not `allowed` from distlib, return the statistics"""
+    stats = dict(files=0, bytes=0, kept_files=0, kept_bytes=0)
+    for root, dirs, files in os.walk(DISTLIB_DIR, topdown=False):
+        for name in files:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, DISTLIB_DIR)
+            size = os.path.getsize(path)
+            stats['files'] += 1
+            stats['bytes'] += size
+            if rel in allowed or is_metadata(rel) or \
+                    [pattern for pattern in keep if fnmatch(rel, pattern)]:
+                stats['kept_files'] += 1
+                stats['kept_bytes'] += size
+            elif not dry_run:
+                os.remove(path)
+        if not dry_run and root != DISTLIB_DIR and not os.listdir(root) \
+                and os.path.relpath(root, DISTLIB_DIR) not in allowed:
+            os.rmdir(root)
+    return stats
+
+
+def report(stats):
+    def percent(part, total):
+        return total and 100.0 * part / total or 0.0
+
+    print 'files: %d -> %d (-%.1f%%)' % (
+        stats['files'], stats['kept_files'],
+        percent(stats['files'] - stats['kept_files'], stats['files']))
+    print 'size:  %.1f MB -> %.1f MB (-%.1f%%)' % (
+        stats['bytes'] / 1048576.0, stats['kept_bytes'] / 1048576.0,
+        percent(stats['bytes'] - stats['kept_bytes'], stats['bytes']))
+
+
+def main(argv=sys.argv[1:]):
+    parser = OptionParser(usage='%prog trace|apply [options]')
+    parser.add_option('--paths',
+                      help='file with one request path per line')
+    parser.add_option('--allowlist', default=ALLOWLIST,
+                      help='allowlist to write or apply')
+    parser.add_option('--keep', action='append', default=[],
+                      help='glob of distlib paths to keep in any case')
+    parser.add_option('--dry-run', action='store_true',
+                      help='only report what apply would remove')
+    parser.add_option('--force', action='store_true',
+                      help='apply an implausibly short allowlist')
+    options, args = parser.parse_args(argv)
+    if args != ['trace'] and args != ['apply']:
+        parser.error('either trace or apply is required')
+
+    if args[0] == 'trace':
+        paths = DEFAULT_PATHS
+        if options.paths:
+            paths = [line.strip() for line in open(options.paths)
+                     if line.strip()]
+        allowed = trace(paths)
+        write_allowlist(allowed, options.allowlist)
+        print 'wrote %d paths to %s' % (len(allowed), options.allowlist)
+        report(prune(allowed, options.keep, dry_run=True))
+    else:
+        allowed = read_allowlist(options.allowlist)
+        if len(allowed) < MIN_ALLOWLIST and not (options.force or
+                                                 options.dry_run):
+            parser.error('%s lists %d paths only, trace again or use --force'
+                         % (options.allowlist, len(allowed)))
+        report(prune(allowed, options.keep, options.dry_run))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""Replay an access log against the app and report latencies.
+
+Run it with the interpreter generated by buildout::
+
+    ./bin/python-gae tools/replay.py requests.log [options]
+
+The log is either App Engine's request log as written by
+``appcfg.py request_logs`` (combined log format), a csv file with the
+columns timestamp, method and path, or json lines with these keys.
+Timestamps are seconds, the combined log format has dates.
+
+Requests go to ``main.application`` in-process by default, with the
+datastore stubbed unless ``--store`` selects another node store, or to a
+running server given with ``--url``, i.e. the dev_appserver. ``--speed``
+divides the time between the requests, 0 sends them as fast as the
+``--concurrency`` workers can. In-process static files are not served,
+app.yaml maps them.
+
+The report lists latency percentiles per route class: the root, nodes by
+depth, 404s, static files and App Engine's ``/_ah/`` urls.
+"""
+import calendar
+import csv
+from datetime import datetime
+import json
+import math
+from optparse import OptionParser
+import os
+import Queue
+import re
+import sys
+import threading
+import time
+import urllib2
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(BASE_DIR, 'app')
+
+COMBINED = re.compile(
+    r'\S+ \S+ \S+ \[(?P<date>[^\]]+)\] "(?P<method>[A-Z]+) (?P<path>\S+)')
+
+PERCENTILES = (50, 90, 99)
+
+
+def parse_date(value):
+    """Seconds since the epoch for a combined log format date"""
+    date, _, offset = value.partition(' ')
+    timestamp = calendar.timegm(
+        datetime.strptime(date, '%d/%b/%Y:%H:%M:%S').timetuple())
+    if offset:
+        sign = offset[0] == '-' and -1 or 1
+        timestamp -= sign * (int(offset[1:3]) * 3600 + int(offset[3:5]) * 60)
+    return timestamp
+
+
+def read_log(filename):
+    """Return the (timestamp, method, path) of the requests, sorted by time"""
+    requests = []
+    f = open(filename, 'rb')
+    try:
+        first = f.readline()
+        f.seek(0)
+        if first.lstrip().startswith('{'):
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    requests.append((float(entry.get('timestamp', 0)),
+                                     entry.get('method', 'GET'),
+                                     entry['path']))
+        elif COMBINED.match(first):
+            for line in f:
+                match = COMBINED.match(line)
+                if match:
+                    requests.append((parse_date(match.group('date')),
+                                     match.group('method'),
+                                     match.group('path')))
+        else:
+            for row in csv.DictReader(f):
+                requests.append((float(row.get('timestamp') or 0),
+                                 row.get('method') or 'GET', row['path']))
+    finally:
+        f.close()
+    requests.sort(key=lambda request: request[0])
+    return requests
+
+
+def route_class(path, status):
+    if status == 404:
+        return '404'
+    path = path.split('?', 1)[0]
+    if path.startswith('/static/') or path == '/favicon.ico':
+        return 'static'
+    if path.startswith('/_ah/'):
+        return 'appengine'
+    depth = len([name for name in path.split('/') if name])
+    if depth == 0:
+        return 'root'
+    if depth >= 4:
+        return 'node depth 4+'
+    return 'node depth %d' % depth
+
+
+def in_process(store=None):
+    """Return a function sending a request to main.application"""
+    sys.path.insert(0, APP_DIR)
+    os.chdir(APP_DIR)
+    from import_profile import activate_stubs
+    activate_stubs()
+    import main
+    from webob import Request
+    if store:
+        from example_app import models
+        main.application.app
+        models.set_store(models.store_from_settings({'node_store': store}))
+
+    def send(method, path):
+        request = Request.blank(path, environ={'REQUEST_METHOD': method})
+        response = request.get_response(main.application)
+        response.body
+        return response.status_int
+    return send
+
+
+def over_http(url):
+    """Return a function sending a request to the server at `url`"""
+    url = url.rstrip('/')
+
+    def send(method, path):
+        request = urllib2.Request(url + path)
+        request.get_method = lambda: method
+        try:
+            response = urllib2.urlopen(request)
+        except urllib2.HTTPError, e:
+            e.read()
+            return e.code
+        response.read()
+        return response.getcode()
+    return send
+
+
+def replay(requests, send, speed=1.0, concurrency=4):
+    """Send the requests, return the (class, status, seconds) of each and
+    the total duration.
+    """
+    queue = Queue.Queue(concurrency * 4)
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            request = queue.get()
+            if request is None:
+                return
+            method, path = request
+            start = time.time()
+            try:
+                status = send(method, path)
+            except Exception:
+                status = 'error'
+            elapsed = time.time() - start
+            with lock:
+                results.append((route_class(path, status), status, elapsed))
+
+    workers = [threading.Thread(target=worker) for i in range(concurrency)]
+    for thread in workers:
+        thread.daemon = True
+        thread.start()
+    start = time.time()
+    first = requests and requests[0][0] or 0
+    for timestamp, method, path in requests:
+        if speed:
+            delay = (timestamp - first) / speed - (time.time() - start)
+            if delay > 0:
+                time.sleep(delay)
+        queue.put((method, path))
+    for thread in workers:
+        queue.put(None)
+    for thread in workers:
+        thread.join()
+    return results, time.time() - start
+
+
+def percentile(values, percent):
+    """Nearest rank percentile of the sorted `values`"""
+    index = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+def report(results, duration, out=sys.stdout):
+    by_class = {}
+    errors = {}
+    for name, status, elapsed in results:
+        by_class.setdefault(name, []).append(elapsed)
+        if status == 'error' or status >= 500:
+            errors[name] = errors.get(name, 0) + 1
+    header = ['%-14s' % 'class', '%7s' % 'count', '%6s' % 'errors'] + \
+        ['%8s' % ('p%d ms' % p) for p in PERCENTILES] + ['%8s' % 'max ms']
+    out.write(' '.join(header) + '\n')
+    for name in sorted(by_class):
+        values = sorted(by_class[name])
+        row = ['%-14s' % name, '%7d' % len(values),
+               '%6d' % errors.get(name, 0)]
+        row += ['%8.1f' % (percentile(values, p) * 1000) for p in PERCENTILES]
+        row.append('%8.1f' % (values[-1] * 1000))
+        out.write(' '.join(row) + '\n')
+    out.write('%d requests in %.1fs, %.1f requests/s\n' % (
+        len(results), duration, duration and len(results) / duration or 0))
+
+
+def main(argv=sys.argv[1:]):
+    parser = OptionParser(usage='%prog LOGFILE [options]')
+    parser.add_option('--url', help='replay against the server at this url')
+    parser.add_option('--store',
+                      help='node store for in-process replays, i.e. memory')
+    parser.add_option('--speed', type='float', default=1.0,
+                      help='speed-up of the logged timing, 0 for no pauses')
+    parser.add_option('--concurrency', type='int', default=4)
+    parser.add_option('--limit', type='int',
+                      help='replay the first LIMIT requests only')
+    options, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error('a log file is required')
+
+    requests = read_log(os.path.abspath(args[0]))[:options.limit]
+    if options.url:
+        send = over_http(options.url)
+    else:
+        send = in_process(options.store)
+    results, duration = replay(requests, send, options.speed,
+                               options.concurrency)
+    report(results, duration)
+
+
+if __name__ == '__main__':
+    main()